@@ -0,0 +1,2 @@
+# Git engine shared by the GUI (main.py) and the command line (python -m gitengine).
+# Nothing in here may import tkinter or PIL.
@@ -0,0 +1,275 @@
+import subprocess
+import threading
+import statistics
+import platform
+import tempfile
+import pathlib
+import random
+import shutil
+import json
+import time
+import sys
+import os
+
+from .jobs import Job, JobScheduler, OutputBuffer, Pipeline
+from .operations import clone_pipeline, commit_pipeline, pull_pipeline
+from .repo import RefReader, RepoLocator
+from .status import StatusScanner
+
+# Keeps the user's and the system's git config out of the measurements
+ISOLATED_ENV = {
+    "GIT_CONFIG_NOSYSTEM": "1",
+    "GIT_CONFIG_GLOBAL": os.devnull,
+    "GIT_TERMINAL_PROMPT": "0",
+    "GIT_AUTHOR_NAME": "Benchmark",
+    "GIT_AUTHOR_EMAIL": "bench@example.invalid",
+    "GIT_COMMITTER_NAME": "Benchmark",
+    "GIT_COMMITTER_EMAIL": "bench@example.invalid"
+}
+
+def git(*args, input=None):
+    return subprocess.run(["git", *args], input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          check=True).stdout
+
+def fast_import_stream(commits, files, blob_size, refs, seed):
+    # First commit adds every file, later ones rewrite a few of them. Blob
+    # contents come from a seeded generator so every run builds the same repository.
+    rng = random.Random(seed)
+    directories = max(1, files // 100)
+    stamp = 1700000000
+
+    def blob(mark):
+        data = format(rng.getrandbits(blob_size * 4), "0%dx" % blob_size).encode()
+        return b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(data), data)
+
+    mark = 0
+    for number in range(commits):
+        changed = range(files) if number == 0 else rng.sample(range(files), min(files, 10))
+        blobs = {}
+        for index in changed:
+            mark += 1
+            blobs[index] = mark
+            yield blob(mark)
+        mark += 1
+        message = b"commit %d" % number
+        yield b"commit refs/heads/main\nmark :%d\n" % mark
+        yield b"author Benchmark <bench@example.invalid> %d +0000\n" % (stamp + number)
+        yield b"committer Benchmark <bench@example.invalid> %d +0000\n" % (stamp + number)
+        yield b"data %d\n%s\n" % (len(message), message)
+        for index, blob_mark in blobs.items():
+            yield b"M 100644 :%d dir%03d/file%06d.txt\n" % (blob_mark, index % directories, index)
+        yield b"\n"
+    head = mark
+    for number in range(refs):
+        kind = b"heads/branch" if number % 2 == 0 else b"tags/v"
+        yield b"reset refs/%s%d\nfrom :%d\n\n" % (kind, number, head)
+
+def create_repository(path, commits, files, blob_size, refs, seed):
+    git("init", "-q", "--bare", "--initial-branch=main", path)
+    stream = b"".join(fast_import_stream(commits, files, blob_size, refs, seed))
+    git("-C", path, "fast-import", "--quiet", input=stream)
+    git("-C", path, "repack", "-adq")
+    # Without these, file:// clones ignore --filter and the blobless,
+    # treeless and sparse strategies would time full clones
+    git("-C", path, "config", "uploadpack.allowFilter", "true")
+    git("-C", path, "config", "uploadpack.allowAnySHA1InWant", "true")
+
+class Benchmark:
+    def __init__(self, workdir, out, repeat=3):
+        self.workdir = workdir
+        self.out = out
+        self.repeat = repeat
+        self.results = {}
+        self.scheduler = JobScheduler(1)
+
+    def run_job(self, name, pipeline, repo=None):
+        job = Job(name, pipeline, repo=repo, capture=True)
+        done = threading.Event()
+
+        def on_change(changed):
+            if changed.state in ("done", "failed", "cancelled"):
+                done.set()
+
+        self.scheduler.on_change = on_change
+        self.scheduler.submit(job)
+        done.wait()
+        if job.state != "done":
+            raise RuntimeError(f"{name} failed: {job.last_line}")
+        if "filtering not recognized by server" in "".join(job.captured):
+            raise RuntimeError(f"{name}: the server ignored --filter, this was not a partial clone")
+        return job.elapsed
+
+    def measure(self, name, prepare, action, **info):
+        runs = []
+        for run in range(self.repeat):
+            context = prepare(run)
+            runs.append(action(context))
+        self.results[name] = dict(info, runs=[round(value, 4) for value in runs],
+                                  median=round(statistics.median(runs), 4), min=round(min(runs), 4))
+        self.out.emit("bench", name=name, **self.results[name])
+
+    def fresh(self, name):
+        path = os.path.join(self.workdir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        return path
+
+    def clone(self, url, strategy):
+        def prepare(run):
+            return self.fresh(f"clone-{strategy}")
+
+        def action(directory):
+            return self.run_job("clone", clone_pipeline(url, directory, strategy), directory)
+
+        self.measure(f"clone/{strategy}", prepare, action)
+
+    def pull(self, url, commits):
+        # A second clone pushes new commits, the timed pull brings them in
+        def prepare(run):
+            directory = self.fresh("pull")
+            upstream = self.fresh("upstream")
+            git("clone", "-q", url, directory)
+            git("clone", "-q", url, upstream)
+            for number in range(commits):
+                with open(os.path.join(upstream, "pulled.txt"), "a") as f:
+                    f.write(f"{run} {number}\n")
+                git("-C", upstream, "add", "pulled.txt")
+                git("-C", upstream, "commit", "-qm", f"pull {run} {number}")
+            git("-C", upstream, "push", "-q", "origin", "main")
+            return directory
+
+        def action(directory):
+            # Same pipeline as Pull in the GUI, including the report steps
+            head = RefReader(RepoLocator().locate(directory)).head()[1]
+            return self.run_job("pull", pull_pipeline(directory, "main", "ff-only", head=head), directory)
+
+        self.measure("pull", prepare, action, commits=commits)
+
+    def commit(self, url, files):
+        def prepare(run):
+            directory = self.fresh("commit")
+            git("clone", "-q", url, directory)
+            paths = []
+            for number in range(files):
+                path = os.path.join("new", f"dir{number % 50:02d}", f"file{number:06d}.txt")
+                os.makedirs(os.path.join(directory, os.path.dirname(path)), exist_ok=True)
+                with open(os.path.join(directory, path), "w") as f:
+                    f.write(f"{number}\n")
+                paths.append(path)
+            return directory, paths
+
+        def action(context):
+            directory, paths = context
+            return self.run_job("commit", commit_pipeline(directory, directory, "bench", paths), directory)
+
+        self.measure("commit", prepare, action, files=files)
+
+    def status(self, url, modified):
+        directory = self.fresh("status")
+        git("clone", "-q", url, directory)
+        tracked = git("-C", directory, "ls-files", "-z").split(b"\0")[:modified]
+        for path in tracked:
+            if path:
+                with open(os.path.join(directory, os.fsdecode(path)), "ab") as f:
+                    f.write(b"changed\n")
+
+        entries = []
+
+        def action(context):
+            started = time.perf_counter()
+            entries[:] = StatusScanner(directory).scan()
+            return time.perf_counter() - started
+
+        # The first scan fills the untracked cache, like the first refresh in the GUI
+        action(None)
+        self.measure("status", lambda run: None, action, modified=modified)
+        self.results["status"]["entries"] = len(entries)
+
+    def console(self, lines):
+        # Output of a job through JobScheduler into an OutputBuffer that is
+        # drained every 50 ms, the same way ConsoleSink does it in the GUI
+        script = ("import sys\n"
+                  f"for i in range({lines}):\n"
+                  "    sys.stdout.write('line %d of the console benchmark\\n' % i)\n")
+
+        def action(context):
+            buffer = OutputBuffer()
+            stop = threading.Event()
+            dropped.append(0)
+
+            def drain():
+                while True:
+                    stopped = stop.wait(0.05)
+                    dropped[-1] += buffer.drain()[1]
+                    if stopped:
+                        return
+
+            drainer = threading.Thread(target=drain, daemon=True)
+            drainer.start()
+            self.scheduler.on_output = lambda job, text: buffer.write(text)
+            try:
+                elapsed = self.run_job("console", Pipeline.single([sys.executable, "-c", script]))
+            finally:
+                self.scheduler.on_output = None
+                stop.set()
+                drainer.join()
+            return elapsed
+
+        dropped = []
+        self.measure("console", lambda run: None, action, lines=lines)
+        median = self.results["console"]["median"]
+        self.results["console"]["lines_per_second"] = round(lines / median) if median else None
+        # Lines per run that the ring buffer let go between two drains, like
+        # the console does when output arrives faster than it can be shown
+        self.results["console"]["dropped"] = dropped
+
+def compare(results, baseline):
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old and old.get("median"):
+            yield name, old["median"], result["median"], result["median"] / old["median"]
+
+def run(args, out):
+    os.environ.update(ISOLATED_ENV)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="gitengine-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    source = os.path.join(workdir, "source.git")
+    shutil.rmtree(source, ignore_errors=True)
+    started = time.perf_counter()
+    create_repository(source, args.commits, args.files, args.blob_size, args.refs, args.seed)
+    out.emit("bench-repository", path=source, commits=args.commits, files=args.files,
+             blob_size=args.blob_size, refs=args.refs, seconds=round(time.perf_counter() - started, 3))
+
+    url = pathlib.Path(source).resolve().as_uri()
+    bench = Benchmark(workdir, out, args.repeat)
+    try:
+        for strategy in args.strategies:
+            bench.clone(url, strategy)
+        bench.pull(url, args.pull_commits)
+        bench.commit(url, args.commit_files)
+        bench.status(url, args.modified)
+        bench.console(args.console_lines)
+    finally:
+        bench.scheduler.shutdown()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "label": args.label,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": git("--version").decode().strip(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: getattr(args, key) for key in ("commits", "files", "blob_size", "refs", "seed",
+                                                           "repeat", "pull_commits", "commit_files",
+                                                           "modified", "console_lines", "strategies")},
+        "results": bench.results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, old, new, ratio in compare(bench.results, baseline):
+            out.emit("bench-compare", name=name, baseline=old, median=new, ratio=round(ratio, 3))
+    out.emit("summary", output=args.output, duration=round(time.perf_counter() - started, 3))
+    return 0
@@ -0,0 +1,413 @@
+import subprocess
+import argparse
+import threading
+import json
+import time
+import sys
+import os
+
+from .config import CONFIG_FILE, load_config
+from .divergence import AheadBehind
+from .fetcher import can_pull_locally, recorded_fetch
+from .index import changed_files
+from .jobs import Job, JobScheduler, Pipeline
+from .metrics import MetricsStore
+from .objcache import ObjectCache
+from .operations import (BULK_OPERATIONS, CLONE_STRATEGIES, PULL_STRATEGIES, bulk_command, clone_pipeline,
+                         commit_pipeline, git_auth_env, pull_pipeline)
+from .push import count_states, job_push_results, pending_branches, push_pipeline, push_targets
+from .repo import RefReader, RepoLocator
+from .status import StatusScanner
+from .trace2 import default_trace_dir
+from .worktrees import (add_worktree_command, list_worktrees, local_branch, prune_worktrees_command,
+                        remove_worktree_command, worktree_path)
+
+FINISHED = ("done", "failed", "cancelled")
+
+class JsonLines:
+    # One JSON object per line on stdout, safe to call from worker threads
+    def __init__(self, stream=None, output=True, progress=False):
+        self.stream = stream or sys.stdout
+        self.output_events = output
+        self.progress_events = progress
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        line = json.dumps(dict(event=event, time=round(time.time(), 3), **fields))
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def on_output(self, job, text):
+        if self.output_events:
+            self.emit("output", job=job.id, repo=job.repo, text=text.rstrip("\n"))
+
+    def on_progress(self, job, event):
+        if self.progress_events:
+            self.emit("progress", job=job.id, repo=job.repo, phase=event.phase, percent=event.percent,
+                      current=event.current, total=event.total, bytes=event.transferred,
+                      rate=event.rate, eta=event.eta)
+
+    def on_change(self, job):
+        if job.state not in FINISHED:
+            self.emit("job", job=job.id, name=job.name, repo=job.repo, state=job.state)
+            return
+        self.emit("done", job=job.id, name=job.name, repo=job.repo, state=job.state,
+                  returncode=job.returncode, error=job.error,
+                  duration=round(job.elapsed, 3), output_bytes=job.output_bytes,
+                  transferred=job.transferred,
+                  steps=[{"name": step.name, "state": step.state,
+                          "duration": None if step.duration is None else round(step.duration, 3)}
+                         for step in job.pipeline.steps],
+                  **({"trace": job.trace_report.as_dict()} if job.trace_report else {}))
+
+def read_list(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+def clone_target(url, target):
+    name = url.rstrip("/").rsplit("/", 1)[-1]
+    if name.endswith(".git"):
+        name = name[:-4]
+    return os.path.join(target, name)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m gitengine",
+                                     description="Run GitLab Manager operations without the GUI. "
+                                                 "Events are written to stdout as JSON lines.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, help="parallel jobs for bulk commands (default: bulk_jobs from config)")
+    parser.add_argument("--timeout", type=float, help="cancel a job after this many seconds")
+    parser.add_argument("--quiet", action="store_true", help="no output events, only job state changes")
+    parser.add_argument("--progress", action="store_true", help="emit progress events")
+    parser.add_argument("--trace", action="store_true",
+                        help="run git with GIT_TRACE2_EVENT and add a timing breakdown to done events")
+    parser.add_argument("--trace-dir", help="where trace files go, implies --trace (default: the trace directory in the user cache dir)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    clone = commands.add_parser("clone", help="clone a repository")
+    clone.add_argument("url")
+    clone.add_argument("directory")
+    clone.add_argument("--strategy", choices=list(CLONE_STRATEGIES))
+    clone.add_argument("--depth", type=int)
+    clone.add_argument("--branch")
+    clone.add_argument("--sparse", nargs="*", default=None, metavar="PATH")
+
+    pull = commands.add_parser("pull", help="pull a branch of a local repository")
+    pull.add_argument("directory")
+    pull.add_argument("--branch")
+    pull.add_argument("--strategy", choices=list(PULL_STRATEGIES))
+    pull.add_argument("--max-fetch-age", type=float,
+                      help="skip the fetch when the last background fetch is at most this many seconds old")
+
+    push = commands.add_parser("push", help="push branches and tags of a local repository in one git push")
+    push.add_argument("directory")
+    push.add_argument("--branch", action="append", default=[], help="repeatable (default: the configured branch)")
+    push.add_argument("--tag", action="append", default=[], help="repeatable")
+
+    commit = commands.add_parser("commit", help="stage files and commit them")
+    commit.add_argument("directory")
+    commit.add_argument("paths", nargs="*")
+    commit.add_argument("-m", "--message", required=True)
+    commit.add_argument("--all", action="store_true", help="commit every change that git status reports")
+
+    for name in ("pull", *BULK_OPERATIONS):
+        command = commands.add_parser(f"bulk-{name}", help=f"{name} every repository listed in a file")
+        command.add_argument("repo_list", help="file with one repository path per line")
+        if name == "pull":
+            command.add_argument("--strategy", choices=list(PULL_STRATEGIES),
+                                 help="how the checked out branch takes its upstream (default: pull_strategy)")
+
+    bulk_push = commands.add_parser("bulk-push", help="push every branch that is ahead of its upstream, "
+                                                       "in every repository listed in a file")
+    bulk_push.add_argument("repo_list", help="file with one repository path per line")
+    bulk_push.add_argument("--branch", action="append", default=[],
+                           help="also consider this branch besides the checked out one, repeatable")
+    for command in (push, bulk_push):
+        command.add_argument("--atomic", action="store_true", help="update all refs on the remote or none")
+
+    bulk_clone = commands.add_parser("bulk-clone", help="clone every URL listed in a file")
+    bulk_clone.add_argument("url_list", help="file with one 'URL [DIRECTORY]' per line")
+    bulk_clone.add_argument("--target", default=".", help="directory for entries without an explicit directory")
+    bulk_clone.add_argument("--strategy", choices=list(CLONE_STRATEGIES))
+    for command in (clone, bulk_clone):
+        command.add_argument("--object-cache", action="store_true",
+                             help="clone with --reference-if-able from a local mirror of the remote")
+        command.add_argument("--dissociate", action="store_true",
+                             help="copy the borrowed objects so the clone does not depend on the mirror")
+
+    dirty = commands.add_parser("dirty", help="check for modified tracked files by reading the index, "
+                                               "without running git (exit code 1 when anything changed)")
+    dirty.add_argument("directories", nargs="+")
+    dirty.add_argument("--list", action="store_true", help="include the changed paths")
+
+    divergence = commands.add_parser("ahead-behind", help="ahead/behind counts of the current and the "
+                                                           "given branches against their upstreams")
+    divergence.add_argument("directories", nargs="*", help="repositories (default: the configured workspace)")
+    divergence.add_argument("--branch", action="append", default=[], help="also check this branch, repeatable")
+
+    worktree = commands.add_parser("worktree", help="manage worktrees of a repository")
+    worktree.add_argument("action", choices=("list", "add", "remove", "prune"))
+    worktree.add_argument("directory")
+    worktree.add_argument("target", nargs="?", help="branch for add, worktree path for remove")
+    worktree.add_argument("--path", help="where add puts the worktree (default: next to the main worktree)")
+    worktree.add_argument("--force", action="store_true", help="remove even with local changes")
+
+    cache = commands.add_parser("cache", help="show or trim the object cache")
+    cache.add_argument("action", choices=("list", "evict"))
+    cache.add_argument("--max-size", type=float, help="evict down to this many GiB (default: object_cache_size)")
+
+    metrics = commands.add_parser("metrics", help="p50/p95 durations of recorded jobs")
+    metrics.add_argument("--by", choices=("repo", "remote"), default="repo")
+    metrics.add_argument("--days", type=float, help="only jobs started in the last DAYS days")
+
+    bench = commands.add_parser("bench", help="time clone, pull, commit, status and console output "
+                                              "against a generated local repository")
+    bench.add_argument("--commits", type=int, default=50)
+    bench.add_argument("--files", type=int, default=2000)
+    bench.add_argument("--blob-size", type=int, default=1024, help="bytes per file version")
+    bench.add_argument("--refs", type=int, default=20, help="extra branches and tags")
+    bench.add_argument("--seed", type=int, default=1)
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--strategies", nargs="+", choices=list(CLONE_STRATEGIES), default=["full", "blobless"])
+    bench.add_argument("--pull-commits", type=int, default=5, help="new upstream commits per pull")
+    bench.add_argument("--commit-files", type=int, default=1000, help="new files per commit")
+    bench.add_argument("--modified", type=int, default=100, help="modified files during the status scan")
+    bench.add_argument("--console-lines", type=int, default=100000)
+    bench.add_argument("--workdir", help="keep the generated repositories here instead of a temp dir")
+    bench.add_argument("--keep", action="store_true", help="do not delete the temp dir afterwards")
+    bench.add_argument("--label", default="", help="stored in the results, e.g. a version")
+    bench.add_argument("--output", default="bench.json")
+    bench.add_argument("--compare", metavar="FILE", help="earlier results to compare the medians against")
+    return parser
+
+def object_cache(config):
+    return ObjectCache(config["object_cache_dir"] or None, config["object_cache_size"] * 1024 ** 3,
+                       config["object_cache_dissociate"])
+
+def build_jobs(args, config, locator, env):
+    cache = None
+    if args.command in ("clone", "bulk-clone") and (args.object_cache or config["object_cache"]):
+        cache = object_cache(config)
+    dissociate = True if getattr(args, "dissociate", False) else None
+
+    def job(name, pipeline, repo, capture=False):
+        return Job(name, pipeline, timeout=args.timeout or config["job_timeout"] or None, repo=repo, env=env,
+                   capture=capture)
+
+    def repository(directory):
+        info = locator.locate(directory)
+        if info is None:
+            raise ValueError(f"{directory} is not a Git repository")
+        return info
+
+    command = args.command
+    if command == "clone":
+        pipeline = clone_pipeline(args.url, args.directory,
+                                  args.strategy or config["clone_strategy"],
+                                  args.depth or config["clone_depth"] or 1,
+                                  args.branch or config["branch"],
+                                  config["sparse_paths"].split() if args.sparse is None else args.sparse,
+                                  cache, dissociate)
+        return [job("clone", pipeline, args.directory)]
+    if command == "pull":
+        info = repository(args.directory)
+        branch = args.branch or config["branch"] or "main"
+        strategy = args.strategy or config["pull_strategy"]
+        # Local-only is opt-in here, without --max-fetch-age every pull fetches
+        fetch = (strategy == "fetch-only" or args.max_fetch_age is None
+                 or not can_pull_locally(info, branch, recorded_fetch(args.directory, config["fetch_state_file"] or None),
+                                         args.max_fetch_age))
+        pipeline = pull_pipeline(args.directory, branch, strategy, fetch, RefReader(info).head()[1])
+        return [job("pull" if fetch else "pull (local)", pipeline, args.directory)]
+    if command == "push":
+        reader = RefReader(repository(args.directory))
+        refs = reader.snapshot()
+        branches = args.branch or ([] if args.tag else [config["branch"] or "main"])
+        missing = [name for name in branches if name not in refs.local] + [name for name in args.tag
+                                                                           if name not in refs.tags]
+        if missing:
+            raise ValueError(f"No such branch or tag: {', '.join(missing)}")
+        targets = push_targets(reader.upstream_refs(), branches, args.tag)
+        return [job("push", push_pipeline(args.directory, targets, args.atomic), args.directory, capture=True)]
+    if command == "bulk-push":
+        # Repositories without anything ahead of its upstream get no job
+        jobs = []
+        statuses = AheadBehind(args.jobs or config["bulk_jobs"]).scan(read_list(args.repo_list), args.branch)
+        for repo in dict.fromkeys(status.repo for status in statuses):
+            branches = pending_branches(status for status in statuses if status.repo == repo)
+            if branches:
+                targets = push_targets(RefReader(repository(repo)).upstream_refs(), branches)
+                jobs.append(job("push", push_pipeline(repo, targets, args.atomic), repo, capture=True))
+        return jobs
+    if command == "commit":
+        info = repository(args.directory)
+        paths = list(args.paths)
+        if args.all:
+            # Renames take their old path along, only the given paths get committed
+            paths += [path for entry in StatusScanner(info.worktree).scan() if entry.kind != "ignored"
+                      for path in (entry.path, entry.orig_path) if path]
+        if not paths:
+            raise ValueError("Nothing to commit, pass paths or --all")
+        return [job("commit", commit_pipeline(args.directory, info.worktree, args.message, paths), args.directory)]
+    if command == "bulk-clone":
+        jobs = []
+        for line in read_list(args.url_list):
+            url, _, directory = line.partition(" ")
+            directory = directory.strip() or clone_target(url, args.target)
+            pipeline = clone_pipeline(url, directory, args.strategy or config["clone_strategy"],
+                                      config["clone_depth"] or 1, config["branch"],
+                                      config["sparse_paths"].split(), cache, dissociate)
+            jobs.append(job("clone", pipeline, directory))
+        return jobs
+    if command == "worktree":
+        info = repository(args.directory)
+        if args.action == "prune":
+            return [job("worktree prune", Pipeline.single(prune_worktrees_command(info.worktree)), info.worktree)]
+        if not args.target:
+            raise ValueError(f"worktree {args.action} needs a {'branch' if args.action == 'add' else 'path'}")
+        if args.action == "remove":
+            main = list_worktrees(info.worktree)[0].path
+            command = remove_worktree_command(main, args.target, args.force)
+            return [job("worktree remove", Pipeline.single(command), args.target)]
+        refs = RefReader(info).snapshot()
+        path = args.path or worktree_path(list_worktrees(info.worktree)[0].path, local_branch(args.target, refs))
+        command = add_worktree_command(info.worktree, path, args.target, refs)
+        return [job("worktree add", Pipeline.single(command), path)]
+    if command == "bulk-pull":
+        strategy = args.strategy or config["pull_strategy"]
+        return [job("pull", pull_pipeline(repo, strategy=strategy), repo) for repo in read_list(args.repo_list)]
+    operation = command[len("bulk-"):]
+    return [job(operation, Pipeline.single(bulk_command(repo, operation)), repo)
+            for repo in read_list(args.repo_list)]
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    out = JsonLines(output=not args.quiet, progress=args.progress)
+    env = git_auth_env(config["gitlab_url"], config["username"],
+                       os.environ.get("GITLAB_TOKEN") or config["token"])
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    metrics = MetricsStore(config["metrics_file"]) if config["metrics_file"] else None
+
+    if args.command == "bench":
+        from .bench import run  # not needed by any other command
+        try:
+            return run(args, out)
+        except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+            out.emit("error", message=str(e))
+            return 2
+
+    if args.command == "cache":
+        cache = object_cache(config)
+        if args.action == "evict":
+            max_bytes = None if args.max_size is None else args.max_size * 1024 ** 3
+            total, evicted = cache.evict(max_bytes, min_idle=0)
+            out.emit("cache", root=cache.root, size=total, evicted=[mirror.url for mirror in evicted])
+            return 0
+        for mirror in cache.usage():
+            out.emit("mirror", url=mirror.url, path=mirror.path, size=mirror.size,
+                     last_used=round(mirror.last_used, 3), dependents=mirror.dependents())
+        return 0
+
+    if args.command == "dirty":
+        locator = RepoLocator()
+        any_dirty = False
+        for directory in args.directories:
+            info = locator.locate(directory)
+            if info is None:
+                out.emit("dirty", repo=directory, error="not a Git repository")
+                continue
+            try:
+                changes = list(changed_files(info, stop_at_first=not args.list))
+            except (ValueError, OSError) as e:
+                out.emit("dirty", repo=directory, error=str(e))
+                continue
+            # Entries that could not be compared make the answer unknown (null), not dirty
+            dirty = any(reason != "unknown" for _, reason in changes) or (None if changes else False)
+            any_dirty = any_dirty or bool(dirty)
+            fields = {"changes": [{"path": path, "reason": reason} for path, reason in changes]} if args.list else {}
+            out.emit("dirty", repo=directory, dirty=dirty, **fields)
+        return 1 if any_dirty else 0
+
+    if args.command == "ahead-behind":
+        pending = 0
+        divergence = AheadBehind(args.jobs or config["bulk_jobs"])
+        for status in divergence.scan(args.directories or config["workspace"], args.branch):
+            pending += status.state in ("push", "pull", "diverged")
+            fields = {"error": status.error} if status.error else {}
+            out.emit("ahead-behind", repo=status.repo, branch=status.branch, upstream=status.upstream,
+                     ahead=status.ahead, behind=status.behind, state=status.state, **fields)
+        out.emit("summary", pending=pending)
+        return 0
+
+    if args.command == "worktree" and args.action == "list":
+        try:
+            worktrees = list_worktrees(args.directory)
+        except (ValueError, OSError) as e:
+            out.emit("error", message=str(e))
+            return 2
+        for worktree in worktrees:
+            out.emit("worktree", path=worktree.path, branch=worktree.branch, head=worktree.head,
+                     state=worktree.state)
+        return 0
+
+    if args.command == "metrics":
+        since = time.time() - args.days * 86400 if args.days else None
+        for row in metrics.summary(args.by, since) if metrics else []:
+            out.emit("metrics", **row)
+        return 0
+
+    try:
+        jobs = build_jobs(args, config, RepoLocator(), env)
+    except (ValueError, OSError) as e:
+        out.emit("error", message=str(e))
+        return 2
+
+    finished = threading.Condition()
+
+    def on_change(job):
+        out.on_change(job)
+        if job.state in FINISHED:
+            with finished:
+                finished.notify_all()
+
+    trace_dir = args.trace_dir or (default_trace_dir() if args.trace or config["trace_git"] else None)
+    workers = args.jobs or (config["bulk_jobs"] if args.command.startswith("bulk-") else 1)
+    scheduler = JobScheduler(min(workers, max(1, len(jobs))),
+                             on_output=out.on_output,
+                             on_change=on_change,
+                             on_progress=out.on_progress,
+                             metrics=metrics,
+                             trace_dir=trace_dir)
+    started = time.time()
+    for job in jobs:
+        scheduler.submit(job)
+    try:
+        with finished:
+            while not all(job.state in FINISHED for job in jobs):
+                finished.wait(0.5)
+    except KeyboardInterrupt:
+        scheduler.shutdown()
+        out.emit("error", message="Interrupted")
+        return 130
+
+    if any(step.name == "cache" for job in jobs for step in job.pipeline.steps):
+        total, evicted = object_cache(config).evict()
+        out.emit("cache", size=total, evicted=[mirror.url for mirror in evicted])
+
+    results = []
+    for job in jobs:
+        for result in job_push_results(job) if job.captured is not None else ():
+            results.append(result)
+            out.emit("push-ref", repo=job.repo, ref=result.source, destination=result.destination,
+                     state=result.state, summary=result.summary, reason=result.reason)
+    if results:
+        out.emit("push-summary", repos=len(jobs), refs=len(results), **count_states(results))
+
+    failed = [job for job in jobs if job.state != "done"]
+    out.emit("summary", jobs=len(jobs), failed=len(failed), duration=round(time.time() - started, 3))
+    return 1 if failed else 0
@@ -0,0 +1,57 @@
+import platform
+import json
+import os
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_CONFIG = {
+    "repo_url": "",
+    "username": "",
+    "token": "",
+    "local_dir": "",
+    "commit_message": "",
+    "branch": "main",
+    "clone_strategy": "full",
+    "clone_depth": "1",
+    "sparse_paths": "",
+    "max_jobs": 2,
+    "bulk_jobs": 8,
+    "job_timeout": 0,
+    "workspace": [],
+    "gitlab_url": "https://gitlab.com",
+    "gitlab_group": "",
+    "metrics_file": "metrics.jsonl",
+    "trace_git": False,
+    "object_cache": False,
+    "object_cache_dir": "",
+    "object_cache_size": 20,
+    "object_cache_dissociate": False,
+    "dashboard_branches": ["main"],
+    "background_fetch": False,
+    "fetch_interval": 600,
+    "fetch_active_interval": 120,
+    "fetch_jobs": 2,
+    "fetch_state_file": "",
+    "pull_strategy": "ff-only",
+    "pull_max_fetch_age": 300
+}
+
+def user_cache_dir(*names):
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "GitLabManager", *names)
+
+def load_config(path=CONFIG_FILE):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    try:
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return config
+
+def save_config(config, path=CONFIG_FILE):
+    with open(path, 'w') as f:
+        json.dump(config, f)
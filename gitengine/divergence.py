@@ -0,0 +1,108 @@
+import concurrent.futures
+import subprocess
+import threading
+
+from .repo import RefCache, RefReader, RepoLocator
+
+class BranchStatus:
+    def __init__(self, repo, branch, upstream, local_commit=None, upstream_commit=None):
+        self.repo = repo
+        self.branch = branch
+        self.upstream = upstream
+        self.local_commit = local_commit
+        self.upstream_commit = upstream_commit
+        self.ahead = None
+        self.behind = None
+        self.error = None
+        self.cached = False
+
+    @property
+    def state(self):
+        if self.error:
+            return "error"
+        if self.local_commit is None:
+            return "no commits"
+        if self.upstream is None:
+            return "no upstream"
+        if self.upstream_commit is None:
+            return "upstream gone"
+        if self.ahead and self.behind:
+            return "diverged"
+        if self.ahead:
+            return "push"
+        if self.behind:
+            return "pull"
+        return "up to date"
+
+class AheadBehind:
+    # Ahead/behind counts keyed by the two commit ids. A branch pair that did
+    # not move since the last refresh is answered from memory, equal commits
+    # need no git call at all.
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.locator = RepoLocator()
+        self.ref_cache = RefCache()
+
+    def count(self, directory, local_commit, upstream_commit):
+        if local_commit == upstream_commit:
+            return (0, 0), True
+        key = (local_commit, upstream_commit)
+        with self.lock:
+            if key in self.counts:
+                return self.counts[key], True
+        result = subprocess.run(["git", "-C", directory, "rev-list", "--left-right", "--count",
+                                 f"{local_commit}...{upstream_commit}"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise ValueError(result.stderr.decode("utf-8", "replace").strip() or "git rev-list failed")
+        ahead, behind = (int(value) for value in result.stdout.split())
+        with self.lock:
+            self.counts[key] = (ahead, behind)
+        return (ahead, behind), False
+
+    def branches(self, repo, branches=()):
+        # The checked out branch plus any of the given ones that exist locally
+        info = self.locator.locate(repo)
+        if info is None:
+            raise ValueError("not a Git repository")
+        refs = self.ref_cache.get(info)
+        reader = RefReader(info)
+        names = [refs.head_branch] if refs.head_branch else []
+        names += [name for name in branches if name in refs.local and name not in names]
+        statuses = []
+        for name in names:
+            upstream = refs.upstreams.get(name)
+            if upstream is None and f"origin/{name}" in refs.remote:
+                upstream = f"origin/{name}"
+            statuses.append(BranchStatus(repo, name, upstream,
+                                         reader.resolve(f"refs/heads/{name}"),
+                                         reader.resolve(f"refs/remotes/{upstream}") if upstream else None))
+        return statuses
+
+    def fill(self, status):
+        if status.local_commit and status.upstream_commit:
+            try:
+                (status.ahead, status.behind), status.cached = self.count(status.repo, status.local_commit,
+                                                                          status.upstream_commit)
+            except Exception as e:
+                # Shown with the branch, one broken repository must not end the scan
+                status.error = str(e) or type(e).__name__
+        return status
+
+    def scan(self, repos, branches=(), on_status=None):
+        # Resolving refs is cheap file access, only the rev-list calls run in the pool
+        statuses = []
+        for repo in repos:
+            try:
+                found = self.branches(repo, branches)
+            except Exception as e:
+                found = [BranchStatus(repo, "", None)]
+                found[0].error = str(e) or type(e).__name__
+            statuses.extend(found)
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+            for status in pool.map(self.fill, statuses):
+                if on_status:
+                    on_status(status)
+        return statuses
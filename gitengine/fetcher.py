@@ -0,0 +1,212 @@
+import threading
+import random
+import json
+import time
+import os
+
+from .config import user_cache_dir
+from .jobs import Job, JobScheduler, Pipeline
+from .repo import RefReader
+
+class FetchState:
+    def __init__(self, repo, meta=None):
+        meta = meta or {}
+        self.repo = repo
+        self.last_fetch = meta.get("last_fetch")
+        self.last_attempt = meta.get("last_attempt")
+        self.failures = meta.get("failures", 0)
+        self.error = meta.get("error")
+        self.next_due = None
+
+    def as_dict(self):
+        return {"last_fetch": self.last_fetch, "last_attempt": self.last_attempt,
+                "failures": self.failures, "error": self.error}
+
+def fetch_command(repo):
+    return ["git", "-C", repo, "fetch", "--prune", "--quiet"]
+
+def load_fetch_state(path=None):
+    try:
+        with open(path or user_cache_dir("fetch.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def recorded_fetch(repo, path=None):
+    # Last successful background fetch of repo according to the state file
+    return load_fetch_state(path).get(os.path.normpath(repo), {}).get("last_fetch")
+
+def can_pull_locally(info, branch, last_fetch, max_age=300):
+    # Only a background fetch counts. FETCH_HEAD is rewritten by every fetch,
+    # including the previous pull's own, and says nothing about whether the
+    # remote moved since, so it is not taken as proof that origin/<branch> is current.
+    if last_fetch is None or time.time() - last_fetch > max_age:
+        return False
+    return RefReader(info).resolve(f"refs/remotes/origin/{branch}") is not None
+
+class BackgroundFetcher:
+    # Runs `git fetch --prune` for known repositories on its own small job
+    # pool, so the remote-tracking refs are fresh when the user pulls. The
+    # active repository is fetched more often and goes first, the others are
+    # spread out with jitter. Failures back off exponentially up to max_backoff.
+    def __init__(self, repos=(), interval=600, active_interval=120, max_jobs=2, max_backoff=3600, jitter=0.2,
+                 state_path=None, env=None, timeout=300, metrics=None, on_fetched=None):
+        self.interval = interval
+        self.active_interval = active_interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.state_path = state_path or user_cache_dir("fetch.json")
+        self.env = env
+        self.timeout = timeout
+        self.on_fetched = on_fetched
+        self.active = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.in_flight = {}
+        self.errors = {}
+        self.states = {}
+        self.saved = self.load()
+        self.scheduler = JobScheduler(max_jobs, on_output=self.job_output, on_change=self.job_changed,
+                                      metrics=metrics)
+        self.set_repos(repos)
+
+    def load(self):
+        return load_fetch_state(self.state_path)
+
+    def save(self):
+        with self.lock:
+            data = dict(self.saved)
+            data.update({repo: state.as_dict() for repo, state in self.states.items()})
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.state_path + ".tmp", self.state_path)
+        except OSError:
+            pass
+
+    def spread(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def set_repos(self, repos):
+        now = time.time()
+        with self.lock:
+            repos = [os.path.normpath(repo) for repo in repos]
+            for repo in repos:
+                if repo in self.states:
+                    continue
+                state = FetchState(repo, self.saved.get(repo))
+                if state.last_attempt:
+                    state.next_due = state.last_attempt + self.spread(self.delay(state))
+                else:
+                    # Never fetched: spread the first round instead of starting all at once
+                    state.next_due = now + random.uniform(0, min(self.interval, 60))
+                self.states[repo] = state
+            for repo in list(self.states):
+                if repo not in repos and repo != self.active:
+                    del self.states[repo]
+        self.wakeup.set()
+
+    def set_active(self, repo):
+        repo = os.path.normpath(repo) if repo else None
+        with self.lock:
+            self.active = repo
+            if repo and repo not in self.states:
+                self.states[repo] = FetchState(repo, self.saved.get(repo))
+            state = self.states.get(repo)
+            if state and not state.failures:
+                due = (state.last_fetch or 0) + self.active_interval
+                state.next_due = min(state.next_due or due, due)
+        self.wakeup.set()
+
+    def delay(self, state):
+        if state.failures:
+            return min(self.interval * 2 ** (state.failures - 1), self.max_backoff)
+        return self.active_interval if state.repo == self.active else self.interval
+
+    def last_fetch(self, repo):
+        repo = os.path.normpath(repo)
+        with self.lock:
+            state = self.states.get(repo)
+            if state:
+                return state.last_fetch
+        return self.saved.get(repo, {}).get("last_fetch")
+
+    def fetching(self, repo):
+        with self.lock:
+            return os.path.normpath(repo) in self.in_flight
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        self.scheduler.shutdown()
+
+    def due(self, now):
+        # Active repository first, then the ones waiting longest
+        with self.lock:
+            waiting = [state for state in self.states.values()
+                       if state.repo not in self.in_flight and state.next_due is not None and state.next_due <= now]
+            free = self.scheduler.max_workers - len(self.in_flight)
+        waiting.sort(key=lambda state: (state.repo != self.active, state.next_due))
+        return waiting[:max(0, free)]
+
+    def next_wakeup(self, now):
+        with self.lock:
+            times = [state.next_due for state in self.states.values()
+                     if state.repo not in self.in_flight and state.next_due is not None]
+        return max(1.0, min(times) - now) if times else self.interval
+
+    def loop(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            for state in self.due(now):
+                self.submit(state)
+            self.wakeup.wait(min(self.next_wakeup(time.time()), 60))
+            self.wakeup.clear()
+
+    def submit(self, state):
+        # Only as many jobs as the pool has workers, so a newly active
+        # repository never waits behind a queue of background fetches
+        env = dict(self.env or {}, GIT_TERMINAL_PROMPT="0")
+        job = Job("background fetch", Pipeline.single(fetch_command(state.repo), "fetch"), repo=state.repo,
+                  timeout=self.timeout, env=env)
+        with self.lock:
+            self.in_flight[state.repo] = job
+            state.last_attempt = time.time()
+        self.scheduler.submit(job)
+
+    def job_output(self, job, text):
+        # git explains a failure over several lines, the first fatal/error line says what happened
+        for line in text.splitlines():
+            if line.startswith(("fatal:", "error:")) and job.id not in self.errors:
+                self.errors[job.id] = line
+
+    def job_changed(self, job):
+        if job.state not in ("done", "failed", "cancelled"):
+            return
+        repo = os.path.normpath(job.repo)
+        error = self.errors.pop(job.id, None)
+        with self.lock:
+            self.in_flight.pop(repo, None)
+            state = self.states.get(repo)
+            if state is None or self.stopped.is_set():
+                return
+            if job.state == "done":
+                state.last_fetch = job.finished
+                state.failures = 0
+                state.error = None
+            else:
+                state.failures += 1
+                state.error = job.error or error or job.last_line or f"exit code {job.returncode}"
+            state.next_due = time.time() + self.spread(self.delay(state))
+        self.save()
+        self.wakeup.set()
+        if self.on_fetched:
+            self.on_fetched(job, state)
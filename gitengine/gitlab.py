@@ -0,0 +1,112 @@
+import http.client
+import urllib.parse
+import threading
+import json
+import re
+
+class GitLabError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"GitLab API error {status}: {message}")
+        self.status = status
+
+class GitLabClient:
+    # Minimal REST client with keep-alive connections and ETag caching.
+    # Idle connections are shared by all threads, a request takes one out of
+    # the pool and puts it back once the response has been read, so
+    # listings started from short-lived threads still reuse connections.
+    def __init__(self, base_url, token="", timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.idle = {}
+        self.etags = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme, netloc):
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def release(self, scheme, netloc, conn):
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(conn)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def get(self, url):
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path + ("?" + parts.query if parts.query else "")
+        headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        if self.token:
+            headers["PRIVATE-TOKEN"] = self.token
+        with self.lock:
+            cached = self.etags.get(url)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        conn = self.acquire(parts.scheme, parts.netloc)
+        for attempt in (1, 2):
+            try:
+                conn.request("GET", target, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+                # Server dropped the idle keep-alive connection, reconnect once
+                conn.close()
+                if attempt == 2:
+                    raise
+            except Exception:
+                # Half-read response, the connection cannot go back into the pool
+                conn.close()
+                raise
+        self.release(parts.scheme, parts.netloc, conn)
+
+        if response.status == 304 and cached:
+            return cached[1], cached[2]
+        if response.status >= 400:
+            raise GitLabError(response.status, body.decode("utf-8", "replace")[:200])
+
+        data = json.loads(body.decode("utf-8"))
+        links = {key: response.getheader(key) for key in ("X-Next-Page", "Link")}
+        etag = response.getheader("ETag")
+        if etag:
+            with self.lock:
+                self.etags[url] = (etag, data, links)
+        return data, links
+
+    def paginate(self, path, params):
+        query = dict(params, per_page=100)
+        url = f"{self.base_url}/api/v4{path}?{urllib.parse.urlencode(query)}"
+        while url:
+            data, links = self.get(url)
+            for item in data:
+                yield item
+            url = None
+            if links.get("Link"):
+                match = re.search(r'<([^>]+)>;\s*rel="next"', links["Link"])
+                if match:
+                    url = match.group(1)
+            if url is None and links.get("X-Next-Page"):
+                query["page"] = links["X-Next-Page"]
+                url = f"{self.base_url}/api/v4{path}?{urllib.parse.urlencode(query)}"
+
+    def group_projects(self, group, include_subgroups=True):
+        path = f"/groups/{urllib.parse.quote(group, safe='')}/projects"
+        params = {
+            "include_subgroups": str(include_subgroups).lower(),
+            "archived": "false",
+            "simple": "true",
+            "order_by": "path",
+            "sort": "asc"
+        }
+        return self.paginate(path, params)
@@ -0,0 +1,288 @@
+import subprocess
+import platform
+import hashlib
+import struct
+import mmap
+import stat
+import os
+
+from .repo import read_git_config
+
+STAT_FIELDS = struct.Struct(">10I")
+OID_OFFSET = STAT_FIELDS.size
+EXTENSION_HEADER = struct.Struct(">4sI")
+
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE = 0x3000
+FLAG_SKIP_WORKTREE = 0x4000
+FLAG_INTENT_TO_ADD = 0x2000
+
+class IndexEntry:
+    __slots__ = ("path", "oid", "ctime", "mtime", "mtime_ns", "dev", "ino", "mode", "size", "flags", "extended")
+
+    def __init__(self, name, oid, fields, flags, extended):
+        self.path = os.fsdecode(name)
+        self.oid = oid.hex()
+        self.ctime = fields[0]
+        self.mtime = fields[2]
+        self.mtime_ns = fields[3]
+        self.dev = fields[4]
+        self.ino = fields[5]
+        self.mode = fields[6]
+        self.size = fields[9]
+        self.flags = flags
+        self.extended = extended
+
+    @property
+    def stage(self):
+        return (self.flags & FLAG_STAGE) >> 12
+
+class GitIndex:
+    # Reads .git/index (versions 2 to 4) through mmap. Entries are decoded
+    # one at a time while iterating, extensions are only looked at when asked for.
+    def __init__(self, path, hash_size=20):
+        self.path = path
+        self.hash_size = hash_size
+        self.file = None
+        self.map = None
+        self.version = None
+        self.count = 0
+        self.end = None
+        self.stat = None
+        try:
+            self.file = open(path, "rb")
+            self.stat = os.fstat(self.file.fileno())
+        except FileNotFoundError:
+            # Fresh repository without anything staged yet
+            return
+        if self.stat.st_size == 0:
+            return
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, self.version, self.count = struct.unpack_from(">4sII", self.map, 0)
+        if signature != b"DIRC" or self.version not in (2, 3, 4):
+            self.close()
+            raise ValueError(f"{path}: unsupported index (version {self.version})")
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entries(self):
+        for name, fields, flags, extended, start in self.records():
+            yield IndexEntry(name, self.oid(start), fields, flags, extended)
+
+    def oid(self, start):
+        return self.map[start + OID_OFFSET:start + OID_OFFSET + self.hash_size]
+
+    def records(self):
+        # Raw (path bytes, stat fields, flags, extended flags, entry offset)
+        # tuples, cheaper than IndexEntry. oid(offset) reads the object id.
+        if self.map is None:
+            return
+        data = self.map
+        hash_size = self.hash_size
+        flags_at = STAT_FIELDS.size + hash_size
+        version = self.version
+        position = 12
+        previous = b""
+        for _ in range(self.count):
+            start = position
+            fields = STAT_FIELDS.unpack_from(data, position)
+            flags = struct.unpack_from(">H", data, position + flags_at)[0]
+            position += flags_at + 2
+            extended = 0
+            if flags & FLAG_EXTENDED and version >= 3:
+                extended = struct.unpack_from(">H", data, position)[0]
+                position += 2
+            if version == 4:
+                # Path prefix compression: drop N bytes of the previous path, add the rest
+                byte = data[position]
+                position += 1
+                strip = byte & 0x7f
+                while byte & 0x80:
+                    byte = data[position]
+                    position += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7f)
+                end = data.find(b"\0", position)
+                name = previous[:len(previous) - strip] + data[position:end]
+                position = end + 1
+            else:
+                end = data.find(b"\0", position)
+                name = data[position:end]
+                # Entries are NUL padded to a multiple of eight bytes
+                position = start + ((end - start + 8) & ~7)
+            previous = name
+            yield name, fields, flags, extended, start
+        self.end = position
+
+    def extensions(self):
+        # Extension signatures and sizes, the bodies are skipped
+        if self.map is None:
+            return []
+        if self.end is None:
+            for _ in self.records():
+                pass
+        found = []
+        position = self.end
+        limit = len(self.map) - self.hash_size
+        while position + EXTENSION_HEADER.size <= limit:
+            name, size = EXTENSION_HEADER.unpack_from(self.map, position)
+            found.append((name.decode("ascii", "replace"), size))
+            position += EXTENSION_HEADER.size + size
+        return found
+
+def hash_size(common_dir):
+    config = read_git_config(os.path.join(common_dir, "config"))
+    return 32 if config.get("extensions.objectformat", "sha1").lower() == "sha256" else 20
+
+def open_index(info):
+    return GitIndex(os.path.join(info.git_dir, "index"), hash_size(info.common_dir))
+
+CONVERSION_KEYS = r"^(core\.autocrlf|core\.attributesfile|filter\..*)$"
+
+def effective_config(worktree, pattern):
+    # Values from every config level (system, global, XDG, repository), the
+    # later level wins like in git. None when git can't be asked.
+    try:
+        result = subprocess.run(["git", "-C", worktree, "config", "--null", "--get-regexp", pattern],
+                                capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode not in (0, 1):  # 1: nothing matched
+        return None
+    values = {}
+    for item in result.stdout.split(b"\0"):
+        if item:
+            key, _, value = item.partition(b"\n")
+            values[os.fsdecode(key).lower()] = os.fsdecode(value)
+    return values
+
+def global_attributes(config):
+    path = config.get("core.attributesfile")
+    if not path:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        path = os.path.join(base, "git", "attributes")
+    return os.path.exists(os.path.expanduser(path))
+
+class ContentCheck:
+    # Settles racily clean entries the way git does: hash the file as a blob
+    # and compare it with the object id in the index. Files that git would
+    # convert on checkin (autocrlf, clean filters, attributes) can't be hashed
+    # as they are, those come out as unknown. The settings come from one
+    # `git config` call, Git for Windows sets core.autocrlf in the system
+    # config, not in the repository's.
+    def __init__(self, info, hash_size):
+        config = effective_config(info.worktree, CONVERSION_KEYS)
+        self.algorithm = hashlib.sha256 if hash_size == 32 else hashlib.sha1
+        self.worktree = info.worktree
+        self.converts = (config is None
+                         or config.get("core.autocrlf", "false").lower() in ("true", "yes", "on", "1", "input")
+                         or any(key.startswith("filter.") for key in config)
+                         or global_attributes(config)
+                         or os.path.exists(os.path.join(info.common_dir, "info", "attributes")))
+        self.attributes = {}
+
+    def has_attributes(self, directory):
+        # .gitattributes in the directory or any parent up to the worktree
+        if directory not in self.attributes:
+            found = os.path.exists(os.path.join(self.worktree, directory, ".gitattributes"))
+            if directory and not found:
+                found = self.has_attributes(os.path.dirname(directory))
+            self.attributes[directory] = found
+        return self.attributes[directory]
+
+    def compare(self, path, name, oid, mode):
+        if self.converts or self.has_attributes(os.path.dirname(os.fsdecode(name))):
+            return "unknown"
+        try:
+            if mode & 0o170000 == 0o120000:
+                data = os.fsencode(os.readlink(path))
+            else:
+                with open(path, "rb") as f:
+                    data = f.read()
+        except OSError:
+            return "unknown"
+        digest = self.algorithm(b"blob %d\0" % len(data))
+        digest.update(data)
+        return None if digest.digest() == oid else "modified"
+
+def changed_files(info, stop_at_first=False):
+    # Compares the stat data cached in the index with the working tree, the
+    # way git does before it looks at file contents. Yields (path, reason).
+    # Only tracked files are covered, untracked files still need git status.
+    # "unknown" means the file could not be compared, stop_at_first only
+    # stops at an actual change.
+    if any(name.startswith("sharedindex.") for name in os.listdir(info.git_dir)):
+        # With a split index most entries live in a second file
+        raise ValueError("split index is not supported")
+    check_exec = platform.system() != "Windows"
+    with open_index(info) as index:
+        if index.map is None:
+            return
+        index_mtime = (index.stat.st_mtime_ns // 10 ** 9, index.stat.st_mtime_ns % 10 ** 9)
+        prefix = os.fsencode(os.path.join(info.worktree, ""))
+        content = None
+        previous = None
+        for name, fields, flags, extended, start in index.records():
+            path = prefix + name
+            reason = entry_change(path, fields, flags, extended, index_mtime, check_exec)
+            if reason == "racy":
+                # Right after a clone or pull most files share the index's mtime
+                content = content or ContentCheck(info, index.hash_size)
+                reason = content.compare(path, name, index.oid(start), fields[6])
+            # Conflicts have an entry per stage, report the path once
+            if reason and name != previous:
+                previous = name
+                yield os.fsdecode(name), reason
+                if stop_at_first and reason != "unknown":
+                    return
+
+def entry_change(path, fields, flags, extended, index_mtime, check_exec):
+    # fields: ctime, ctime ns, mtime, mtime ns, dev, ino, mode, uid, gid, size
+    mode = fields[6]
+    if extended & FLAG_SKIP_WORKTREE or flags & FLAG_ASSUME_VALID:
+        return None
+    if mode == 0o160000:
+        # Submodules are separate repositories
+        return None
+    if flags & FLAG_STAGE:
+        return "unmerged"
+    if extended & FLAG_INTENT_TO_ADD:
+        return "added"
+    try:
+        st = os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return "deleted"
+    except OSError:
+        return "modified"
+    if stat.S_ISLNK(st.st_mode) != (mode & 0o170000 == 0o120000) or stat.S_ISDIR(st.st_mode):
+        return "type"
+    if check_exec and stat.S_ISREG(st.st_mode) and bool(st.st_mode & 0o100) != bool(mode & 0o100):
+        return "mode"
+    # The index keeps the lower 32 bits of sizes, inodes and seconds
+    seconds, nanoseconds = divmod(st.st_mtime_ns, 10 ** 9)
+    if st.st_size & 0xffffffff != fields[9] or seconds & 0xffffffff != fields[2]:
+        return "modified"
+    if fields[3] and nanoseconds != fields[3]:
+        return "modified"
+    if fields[5] and st.st_ino and st.st_ino & 0xffffffff != fields[5]:
+        return "modified"
+    if (fields[2], fields[3]) >= index_mtime:
+        # Written in the same instant as the index: a change right after
+        # staging would not show up in the stat data, the contents decide
+        return "racy"
+    return None
+
+def is_dirty(info):
+    return any(reason != "unknown" for _, reason in changed_files(info, stop_at_first=True))
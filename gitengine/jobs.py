@@ -0,0 +1,457 @@
+import subprocess
+import threading
+import itertools
+import platform
+import codecs
+import signal
+import queue
+import time
+import re
+import os
+from collections import deque
+
+from .trace2 import Trace2Report, prune_traces
+
+class OutputBuffer:
+    # Thread-safe ring buffer between git worker threads and the console
+    def __init__(self, max_lines=5000):
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.cleared = False
+
+    def write(self, text):
+        with self.lock:
+            if len(self.pending) == self.max_lines:
+                self.dropped += 1
+            self.pending.append(text)
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+            self.dropped = 0
+            self.cleared = True
+
+    def drain(self):
+        with self.lock:
+            cleared, dropped, lines = self.cleared, self.dropped, list(self.pending)
+            self.pending.clear()
+            self.dropped = 0
+            self.cleared = False
+        return cleared, dropped, lines
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def describe_command(command):
+    args = command[1:]
+    while args and args[0].startswith("-"):
+        args = args[2:] if args[0] in ("-C", "-c") else args[1:]
+    return " ".join(command[:1] + args[:1])
+
+PROGRESS_RE = re.compile(
+    r"^(?:remote: )?(?P<phase>[A-Z][a-z]+(?: [a-z]+)*):\s+(?P<percent>\d+)% "
+    r"\((?P<current>\d+)/(?P<total>\d+)\)"
+    r"(?:, (?P<size>[\d.]+ (?:bytes|[KMGT]iB))(?: \| (?P<rate>[\d.]+ (?:bytes|[KMGT]iB))/s)?)?"
+    r"(?P<done>, done\.)?"
+)
+
+SIZE_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+
+def parse_size(text):
+    value, unit = text.split()
+    return int(float(value) * SIZE_UNITS[unit])
+
+class ProgressEvent:
+    def __init__(self, phase, percent, current, total, transferred=None, rate=None, eta=None, done=False):
+        self.phase = phase
+        self.percent = percent
+        self.current = current
+        self.total = total
+        self.transferred = transferred
+        self.rate = rate
+        self.eta = eta
+        self.done = done
+
+    def describe(self):
+        parts = [f"{self.phase} {self.percent}% ({self.current}/{self.total})"]
+        if self.transferred is not None:
+            parts.append(format_bytes(self.transferred))
+        if self.rate:
+            parts.append(f"{format_bytes(self.rate)}/s")
+        if self.eta is not None and not self.done:
+            parts.append(f"ETA {int(self.eta) // 60}:{int(self.eta) % 60:02d}")
+        return " | ".join(parts)
+
+class ProgressParser:
+    # Turns git's --progress lines into ProgressEvents
+    def __init__(self):
+        self.phase_started = {}
+
+    def parse(self, text):
+        match = PROGRESS_RE.match(text)
+        if not match:
+            return None
+        phase = match.group("phase")
+        current, total = int(match.group("current")), int(match.group("total"))
+        now = time.time()
+        started = self.phase_started.setdefault(phase, now)
+
+        eta = None
+        if 0 < current < total and now > started:
+            eta = (total - current) / (current / (now - started))
+        transferred = parse_size(match.group("size")) if match.group("size") else None
+        rate = parse_size(match.group("rate")) if match.group("rate") else None
+        return ProgressEvent(phase, int(match.group("percent")), current, total,
+                             transferred, rate, eta, bool(match.group("done")))
+
+class Step:
+    def __init__(self, name, command, depends_on=(), input=None, note="", optional=False):
+        self.name = name
+        self.command = command
+        self.depends_on = list(depends_on)
+        self.input = input
+        self.note = note
+        # A failed optional step only blocks its dependents, not the job
+        self.optional = optional
+        self.state = "pending"
+        self.returncode = None
+        self.duration = None
+
+class Pipeline:
+    # Ordered git steps, a step only runs once everything it depends on succeeded
+    def __init__(self):
+        self.steps = []
+
+    @classmethod
+    def single(cls, command, name=None):
+        pipeline = cls()
+        pipeline.add(name or describe_command(command), command)
+        return pipeline
+
+    def add(self, name, command, depends_on=None, input=None, note="", optional=False):
+        if depends_on is None:
+            depends_on = [self.steps[-1].name] if self.steps else []
+        step = Step(name, command, depends_on, input, note, optional)
+        self.steps.append(step)
+        return step
+
+    def ordered(self):
+        by_name = {step.name: step for step in self.steps}
+        for step in self.steps:
+            for dep in step.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+        ordered, done = [], set()
+        while len(ordered) < len(self.steps):
+            ready = [step for step in self.steps
+                     if step.name not in done and all(dep in done for dep in step.depends_on)]
+            if not ready:
+                raise ValueError("Pipeline contains a dependency cycle")
+            # Keep insertion order among steps that are ready together
+            ordered.append(ready[0])
+            done.add(ready[0].name)
+        return ordered
+
+    def blocked(self, step):
+        by_name = {s.name: s for s in self.steps}
+        return any(by_name[dep].state != "done" for dep in step.depends_on)
+
+    def summary(self):
+        lines = []
+        for step in self.steps:
+            duration = f"{step.duration:.2f}s" if step.duration is not None else "-"
+            lines.append(f"  {step.name:<12} {step.state:<9} {duration:>8}\n")
+        return lines
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, name, pipeline, success_msg="", error_msg="", timeout=None, repo=None, env=None,
+                 capture=False):
+        self.id = next(Job._ids)
+        self.name = name
+        self.pipeline = pipeline
+        self.env = env
+        self.output_bytes = 0
+        self.transferred = 0
+        self.progress = None
+        self.last_line = ""
+        self.success_msg = success_msg
+        self.error_msg = error_msg
+        self.timeout = timeout
+        self.repo = repo
+        self.state = "queued"
+        self.process = None
+        self.returncode = None
+        self.error = None
+        self.timed_out = False
+        self.cancel_requested = False
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.trace = None
+        self.trace_report = None
+        # Complete output for jobs whose result has to be parsed afterwards
+        self.captured = [] if capture else None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+class JobScheduler:
+    # Fixed pool of worker threads, every git operation goes through here
+    def __init__(self, max_workers=2, on_output=None, on_change=None, on_progress=None, metrics=None,
+                 trace_dir=None):
+        self.max_workers = max(1, int(max_workers))
+        self.on_output = on_output
+        self.on_change = on_change
+        self.on_progress = on_progress
+        self.metrics = metrics
+        # When set, every job runs with GIT_TRACE2_EVENT pointed at its own file in here
+        self.trace_dir = trace_dir
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.workers = []
+        for _ in range(self.max_workers):
+            worker = threading.Thread(target=self.worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, job):
+        with self.lock:
+            finished = [j for j in self.jobs.values() if j.state in ("done", "failed", "cancelled")]
+            for old in finished[:-200]:
+                del self.jobs[old.id]
+            self.jobs[job.id] = job
+        self.notify(job)
+        self.pending.put(job)
+        return job
+
+    def running(self):
+        with self.lock:
+            return [job for job in self.jobs.values() if job.state == "running"]
+
+    def cancel(self, job):
+        with self.lock:
+            job.cancel_requested = True
+            if job.state == "queued":
+                job.state = "cancelled"
+                job.finished = time.time()
+            process = job.process
+        if process is not None:
+            self.kill(process)
+        self.notify(job)
+
+    def shutdown(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if job.state in ("queued", "running"):
+                self.cancel(job)
+        for _ in self.workers:
+            self.pending.put(None)
+
+    def notify(self, job):
+        if self.on_change:
+            self.on_change(job)
+
+    def output(self, job, text):
+        job.output_bytes += len(text)
+        if job.captured is not None:
+            job.captured.append(text)
+        if text.strip():
+            job.last_line = text.strip()
+        if self.on_output:
+            self.on_output(job, text)
+
+    def worker_loop(self):
+        while True:
+            job = self.pending.get()
+            if job is None:
+                return
+            with self.lock:
+                if job.state != "queued":
+                    continue
+                job.state = "running"
+                job.started = time.time()
+            self.notify(job)
+            timer = None
+            if job.timeout:
+                timer = threading.Timer(job.timeout, self.expire, (job,))
+                timer.daemon = True
+                timer.start()
+            try:
+                self.execute(job)
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                if timer:
+                    timer.cancel()
+            with self.lock:
+                job.finished = time.time()
+                if job.cancel_requested and not job.timed_out:
+                    job.state = "cancelled"
+                elif job.returncode == 0 and job.error is None:
+                    job.state = "done"
+                else:
+                    job.state = "failed"
+            if self.metrics:
+                try:
+                    self.metrics.record(job)
+                except OSError:
+                    pass
+            self.notify(job)
+
+    def execute(self, job):
+        if self.trace_dir:
+            # Only readable by the user, the raw traces keep the full command lines
+            os.makedirs(self.trace_dir, mode=0o700, exist_ok=True)
+            prune_traces(self.trace_dir)
+            job.trace = os.path.join(self.trace_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-job{job.id}.json")
+        steps = job.pipeline.ordered()
+        for step in steps:
+            if job.cancel_requested or job.pipeline.blocked(step):
+                step.state = "skipped"
+                continue
+            step.state = "running"
+            started = time.time()
+            note = f"  # {step.note}" if step.note else ""
+            self.output(job, f"$ {' '.join(step.command)}{note}\n")
+            step.returncode = self.run_step(job, step)
+            step.duration = time.time() - started
+            step.state = "done" if step.returncode == 0 else "failed"
+            if step.returncode != 0 and not step.optional and job.returncode is None:
+                job.returncode = step.returncode
+        if job.returncode is None:
+            job.returncode = 0
+        if len(steps) > 1:
+            self.output(job, "Step timings:\n")
+            for line in job.pipeline.summary():
+                self.output(job, line)
+        if job.trace and os.path.exists(job.trace):
+            job.trace_report = Trace2Report.parse(job.trace)
+            for line in job.trace_report.describe():
+                self.output(job, line)
+        if job.timed_out:
+            job.error = f"Timed out after {job.timeout}s"
+
+    def run_step(self, job, step):
+        if platform.system() == "Windows":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True}
+
+        env = None
+        if job.env or job.trace:
+            env = dict(os.environ, **(job.env or {}))
+        if job.trace:
+            env["GIT_TRACE2_EVENT"] = job.trace
+
+        process = subprocess.Popen(
+            step.command,
+            env=env,
+            stdin=subprocess.PIPE if step.input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **group
+        )
+        with self.lock:
+            job.process = process
+            cancelled = job.cancel_requested
+        if cancelled or job.timed_out:
+            self.kill(process)
+        if step.input is not None:
+            # Feed stdin from its own thread so a full stdout pipe can't deadlock us
+            threading.Thread(target=self.feed, args=(process, step.input), daemon=True).start()
+
+        # git redraws progress with \r, so split on both line endings ourselves
+        parser = ProgressParser()
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        pending = ""
+        try:
+            while True:
+                chunk = process.stdout.read1(65536)
+                if not chunk:
+                    break
+                pending += decoder.decode(chunk)
+                segments = re.split(r"(\r\n|\r|\n)", pending)
+                pending = segments.pop()
+                for text, end in zip(segments[::2], segments[1::2]):
+                    self.segment(job, parser, text, end != "\r")
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                self.segment(job, parser, pending, True)
+            return process.wait()
+        finally:
+            process.stdout.close()
+            with self.lock:
+                job.process = None
+
+    def feed(self, process, data):
+        try:
+            process.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def segment(self, job, parser, text, final):
+        text = text.rstrip()
+        event = parser.parse(text)
+        if event is None:
+            if text:
+                self.output(job, text + "\n")
+            return
+        job.progress = event
+        if event.transferred:
+            job.transferred = max(job.transferred, event.transferred)
+        if self.on_progress:
+            self.on_progress(job, event)
+        # Only the finished state of a phase ends up in the console
+        if final or event.done:
+            self.output(job, text + "\n")
+
+    def expire(self, job):
+        with self.lock:
+            job.timed_out = True
+            job.cancel_requested = True
+            process = job.process
+        if process is not None:
+            self.kill(process)
+
+    def kill(self, process):
+        # Kill the whole process group so git's helpers (remote-https, ssh) go
+        # too. Never waits, cancel() is called from the UI thread: SIGKILL
+        # follows from a timer thread if SIGTERM was not enough, the worker
+        # reaps the process as usual.
+        if process.poll() is not None:
+            return
+        try:
+            if platform.system() == "Windows":
+                subprocess.Popen(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+                timer = threading.Timer(3, self.escalate, args=(process,))
+                timer.daemon = True
+                timer.start()
+        except (ProcessLookupError, OSError):
+            process.kill()
+
+    def escalate(self, process):
+        if process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
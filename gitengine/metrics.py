@@ -0,0 +1,115 @@
+import threading
+import json
+import os
+import re
+
+from .repo import RepoLocator, read_git_config
+
+METRICS_FILE = "metrics.jsonl"
+
+def remote_host(url):
+    # Host part of a remote URL, credentials and paths stripped
+    if not url:
+        return ""
+    match = re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/]*@)?([^/]*)", url)
+    if match:
+        return match.group(1) or "local"
+    match = re.match(r"^(?:[^@/]*@)?([^:/\\]{2,}):", url)
+    if match:
+        return match.group(1)
+    return "local"
+
+def percentile(values, fraction):
+    # Linear interpolation between the closest ranks, values must be sorted
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return round(values[lower] + (values[upper] - values[lower]) * (position - lower), 3)
+
+class MetricsStore:
+    # Append-only JSON lines file with one record per finished job
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.locator = RepoLocator()
+
+    def remote(self, job):
+        for step in job.pipeline.steps:
+            if step.command[:2] == ["git", "clone"]:
+                # clone_pipeline always ends the command with URL and directory
+                return remote_host(step.command[-2])
+        if not job.repo:
+            return ""
+        try:
+            info = self.locator.locate(job.repo)
+        except OSError:
+            return ""
+        if info is None:
+            return ""
+        config = read_git_config(os.path.join(info.common_dir, "config"))
+        return remote_host(config.get("remote.origin.url", ""))
+
+    def record(self, job):
+        if not self.path or job.started is None:
+            return None
+        record = {
+            "job": job.id,
+            "operation": job.name,
+            "repo": job.repo or "",
+            "remote": self.remote(job),
+            "state": job.state,
+            "returncode": job.returncode,
+            "started": round(job.started, 3),
+            "finished": round(job.finished, 3),
+            "duration": round(job.finished - job.started, 3),
+            "output_bytes": job.output_bytes,
+            "transferred": job.transferred,
+            "steps": [[step.name, None if step.duration is None else round(step.duration, 3), step.returncode]
+                      for step in job.pipeline.steps]
+        }
+        if job.trace_report is not None:
+            record["trace"] = job.trace_report.as_dict()
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return record
+
+    def records(self, since=None):
+        try:
+            f = open(self.path, encoding="utf-8")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves at most one broken line behind
+                    continue
+                if since is None or record.get("started", 0) >= since:
+                    yield record
+
+    def summary(self, by="repo", since=None):
+        groups = {}
+        for record in self.records(since):
+            key = (record.get("operation", ""), record.get(by, ""))
+            groups.setdefault(key, []).append(record)
+        rows = []
+        for (operation, name), records in groups.items():
+            durations = sorted(record["duration"] for record in records if record["state"] == "done")
+            rows.append({
+                "operation": operation,
+                by: name,
+                "runs": len(records),
+                "failed": sum(1 for record in records if record["state"] != "done"),
+                "p50": percentile(durations, 0.5),
+                "p95": percentile(durations, 0.95),
+                "max": durations[-1] if durations else None,
+                "transferred": sum(record.get("transferred", 0) for record in records),
+                "last": max(record["finished"] for record in records)
+            })
+        rows.sort(key=lambda row: (row["p95"] is None, -(row["p95"] or 0)))
+        return rows
@@ -0,0 +1,147 @@
+import threading
+import hashlib
+import shutil
+import json
+import time
+import re
+import os
+
+from .config import user_cache_dir
+
+MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+def strip_credentials(url):
+    return re.sub(r"^([a-zA-Z][a-zA-Z0-9+.-]*://)[^@/]*@", r"\1", url.strip())
+
+def normalize_url(url):
+    # Same mirror for https://user@host/group/repo.git and https://host/group/repo
+    url = re.sub(r"(\.git)?/*$", "", strip_credentials(url))
+    match = re.match(r"^([a-zA-Z][a-zA-Z0-9+.-]*://)([^/]*)(.*)$", url)
+    if match:
+        url = match.group(1).lower() + match.group(2).lower() + match.group(3)
+    return url
+
+def directory_size(path):
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+    return total
+
+class Mirror:
+    def __init__(self, cache, name, meta):
+        self.path = os.path.join(cache.root, name + ".git")
+        self.meta_path = os.path.join(cache.root, name + ".json")
+        self.url = meta.get("url", "")
+        self.last_used = meta.get("last_used", 0)
+        self.clones = meta.get("clones", [])
+        self.size = None
+
+    def dependents(self):
+        # Clones made without --dissociate borrow objects from the mirror
+        # through their alternates file, deleting the mirror would break them
+        objects = os.path.normcase(os.path.abspath(os.path.join(self.path, "objects")))
+        live = []
+        for clone in self.clones:
+            try:
+                with open(os.path.join(clone, ".git", "objects", "info", "alternates")) as f:
+                    alternates = [os.path.normcase(os.path.abspath(line.strip())) for line in f]
+            except OSError:
+                continue
+            if objects in alternates:
+                live.append(clone)
+        return live
+
+class ObjectCache:
+    # One bare mirror per remote. Clones borrow its objects with
+    # --reference-if-able, so only objects the mirror lacks are downloaded.
+    def __init__(self, root=None, max_bytes=20 * 1024 ** 3, dissociate=False):
+        self.root = root or user_cache_dir("objects")
+        self.max_bytes = max_bytes
+        self.dissociate = dissociate
+        self.lock = threading.Lock()
+
+    def name(self, url):
+        url = normalize_url(url)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", re.sub(r"^[a-zA-Z][a-zA-Z0-9+.-]*://", "", url))[-60:]
+        return f"{slug.strip('_.')}-{hashlib.sha1(url.encode()).hexdigest()[:10]}"
+
+    def mirror(self, url):
+        return self.mirror_named(self.name(url))
+
+    def mirrors(self):
+        try:
+            names = sorted(name[:-5] for name in os.listdir(self.root) if name.endswith(".json"))
+        except OSError:
+            return []
+        return [self.mirror_named(name) for name in names]
+
+    def mirror_named(self, name):
+        try:
+            with open(os.path.join(self.root, name + ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        return Mirror(self, name, meta)
+
+    def use(self, url, clone):
+        # Marks the mirror as used and remembers the clone that will reference it
+        mirror = self.mirror(url)
+        clone = os.path.abspath(clone)
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            clones = [path for path in mirror.clones if path != clone and os.path.isdir(path)]
+            meta = {"url": strip_credentials(url), "last_used": time.time(), "clones": clones + [clone]}
+            with open(mirror.meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(mirror.meta_path + ".tmp", mirror.meta_path)
+        return mirror
+
+    def update_command(self, url, mirror):
+        if os.path.exists(os.path.join(mirror.path, "HEAD")):
+            return ["git", "-C", mirror.path, "fetch", "--prune", "--progress", url, *MIRROR_REFSPECS]
+        return ["git", "clone", "--bare", "--progress", url, mirror.path]
+
+    def clone_options(self, mirror, dissociate=None):
+        options = ["--reference-if-able", mirror.path]
+        if self.dissociate if dissociate is None else dissociate:
+            options.append("--dissociate")
+        return options
+
+    def usage(self):
+        mirrors = self.mirrors()
+        for mirror in mirrors:
+            mirror.size = directory_size(mirror.path)
+        return mirrors
+
+    def evict(self, max_bytes=None, min_idle=600):
+        # Least recently used mirrors go first. Mirrors that clones still
+        # reference, or that were used in the last min_idle seconds, stay.
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        mirrors = self.usage()
+        total = sum(mirror.size for mirror in mirrors)
+        evicted = []
+        for mirror in sorted(mirrors, key=lambda mirror: mirror.last_used):
+            if total <= limit:
+                break
+            if mirror.dependents() or time.time() - mirror.last_used < min_idle:
+                continue
+            shutil.rmtree(mirror.path, ignore_errors=True)
+            try:
+                os.remove(mirror.meta_path)
+            except OSError:
+                pass
+            total -= mirror.size
+            evicted.append(mirror)
+        return total, evicted
@@ -0,0 +1,141 @@
+import base64
+import os
+import re
+
+from .jobs import Pipeline
+
+def relative_paths(worktree, paths):
+    root = os.path.join(os.path.abspath(worktree), "")
+    for path in paths:
+        if os.path.isabs(path):
+            path = os.path.relpath(path, root) if path.startswith(root) else path
+        yield path.replace(os.sep, "/")
+
+def add_stage_step(pipeline, worktree, paths):
+    # update-index reads the NUL separated list from stdin: one git call for
+    # any number of files, no command line length limit and no pathspec
+    # matching (which gets slow with thousands of pathspecs)
+    paths = list(relative_paths(worktree, paths))
+    data = b"\0".join(os.fsencode(path) for path in paths)
+    return pipeline.add("add", ["git", "-C", worktree, "update-index", "--add", "--remove", "-z", "--stdin"],
+                        input=data, note=f"{len(paths)} paths via stdin")
+
+CLONE_STRATEGIES = {
+    "full": [],
+    "shallow": ["--depth", "{depth}"],
+    "blobless": ["--filter=blob:none"],
+    "treeless": ["--filter=tree:0"],
+    "single-branch": ["--single-branch", "--branch", "{branch}"],
+    "sparse": ["--filter=blob:none", "--sparse"]
+}
+
+# A mirror always holds the full history of the remote. Creating one for a
+# shallow or partial clone would download far more than the clone itself.
+CACHED_STRATEGIES = ("full", "single-branch")
+
+def clone_pipeline(url, directory, strategy="full", depth=1, branch="", sparse_paths=(), cache=None,
+                   dissociate=None):
+    if strategy not in CLONE_STRATEGIES:
+        raise ValueError(f"Unknown clone strategy '{strategy}'")
+    options = [option.format(depth=max(1, int(depth)), branch=branch or "main")
+               for option in CLONE_STRATEGIES[strategy]]
+    pipeline = Pipeline()
+    note = ""
+    if cache is not None and strategy not in CACHED_STRATEGIES:
+        note = f"object cache not used for {strategy} clones"
+    elif cache is not None:
+        # Bring the remote's mirror up to date first, the clone then only
+        # downloads what the mirror does not have. Without a usable mirror
+        # --reference-if-able falls back to a normal clone.
+        mirror = cache.use(url, directory)
+        pipeline.add("cache", cache.update_command(url, mirror), optional=True, note="object cache")
+        options = cache.clone_options(mirror, dissociate) + options
+    pipeline.add("clone", ["git", "clone", "--progress", *options, url, directory], depends_on=[], note=note)
+    if strategy == "sparse" and sparse_paths:
+        pipeline.add("sparse", ["git", "-C", directory, "sparse-checkout", "set", "--cone", *sparse_paths])
+    return pipeline
+
+def upgrade_pipeline(directory, git_dir):
+    # Turns a shallow, single-branch or partial clone into a complete one
+    config_path = os.path.join(git_dir, "config")
+    config = ""
+    if os.path.exists(config_path):
+        with open(config_path, encoding="utf-8", errors="replace") as f:
+            config = f.read().lower()
+
+    pipeline = Pipeline()
+    if re.search(r"fetch = \+refs/heads/(?!\*)", config):
+        pipeline.add("widen", ["git", "-C", directory, "remote", "set-branches", "origin", "*"])
+    if "partialclonefilter" in config:
+        pipeline.add("unfilter", ["git", "-C", directory, "config", "--unset-all", "remote.origin.partialclonefilter"])
+        pipeline.add("refetch", ["git", "-C", directory, "fetch", "--progress", "--refetch", "origin"])
+    elif os.path.exists(os.path.join(git_dir, "shallow")):
+        pipeline.add("unshallow", ["git", "-C", directory, "fetch", "--progress", "--unshallow", "origin"])
+    elif pipeline.steps:
+        pipeline.add("fetch", ["git", "-C", directory, "fetch", "--progress", "origin"])
+    return pipeline
+
+def git_auth_env(base_url, username, token):
+    # Passed via GIT_CONFIG_* so the token never shows up in the process list
+    if not token:
+        return {}
+    credentials = base64.b64encode(f"{username or 'oauth2'}:{token}".encode()).decode()
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"http.{base_url.rstrip('/')}/.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+        "GIT_TERMINAL_PROMPT": "0"
+    }
+
+# Pulls go through pull_pipeline
+BULK_OPERATIONS = {
+    "fetch": ["fetch", "--prune", "--progress"],
+    "status": ["status", "--short", "--branch"]
+}
+
+def bulk_command(repo, operation):
+    return ["git", "-C", repo, *BULK_OPERATIONS[operation]]
+
+def commit_pipeline(directory, worktree, message, paths):
+    # Commits exactly the given paths (--only): changes staged for other
+    # paths stay in the index for a later commit. The paths reach git via
+    # stdin, like in the stage step.
+    pipeline = Pipeline()
+    add_stage_step(pipeline, worktree, paths)
+    data = b"\0".join(os.fsencode(path) for path in relative_paths(worktree, paths))
+    pipeline.add("commit", ["git", "-C", worktree, "--literal-pathspecs", "commit", "-m", message, "--only",
+                            "--pathspec-from-file=-", "--pathspec-file-nul"], input=data)
+    return pipeline
+
+def push_command(directory, branch):
+    return ["git", "-C", directory, "push", "--progress", "origin", branch]
+
+PULL_STRATEGIES = {
+    "ff-only": ["merge", "--ff-only", "--no-stat"],
+    "rebase": ["rebase"],
+    "merge": ["merge", "--no-edit", "--no-stat"],
+    "fetch-only": None
+}
+
+def pull_pipeline(directory, branch=None, strategy="ff-only", fetch=True, head=None):
+    # fetch + integrate as separate steps instead of `git pull`, so the
+    # strategy does not depend on pull.rebase/pull.ff in the user's config.
+    # Without a branch the checked out branch's upstream is pulled, like a
+    # plain `git pull`. With fetch=False the remote-tracking ref from an
+    # earlier fetch is merged and the pull never touches the network. head
+    # is the commit before the pull, the report steps list what it brought in.
+    if strategy not in PULL_STRATEGIES:
+        raise ValueError(f"Unknown pull strategy '{strategy}'")
+    pipeline = Pipeline()
+    if fetch:
+        pipeline.add("fetch", ["git", "-C", directory, "fetch", "--progress", *(["origin", branch] if branch else [])])
+    if PULL_STRATEGIES[strategy] is not None:
+        target = f"refs/remotes/origin/{branch}" if branch else "@{upstream}"
+        pipeline.add(strategy, ["git", "-C", directory, *PULL_STRATEGIES[strategy], target],
+                     note="" if fetch else "local only, remote ref is fresh")
+        if head:
+            pipeline.add("log", ["git", "-C", directory, "log", "--oneline", "--no-decorate", "--max-count=50",
+                                 f"{head}..HEAD"], optional=True)
+            pipeline.add("diffstat", ["git", "-C", directory, "diff", "--stat", "--summary", head, "HEAD"],
+                         optional=True)
+    return pipeline
@@ -0,0 +1,80 @@
+import re
+
+from .jobs import Pipeline
+
+# Flags of `git push --porcelain`
+PUSH_FLAGS = {
+    " ": "pushed",
+    "+": "forced",
+    "-": "deleted",
+    "*": "new",
+    "!": "rejected",
+    "=": "up to date"
+}
+
+PORCELAIN_LINE = re.compile(r"^([ +\-*!=])\t([^\t]*)\t(.*)$")
+
+class PushResult:
+    def __init__(self, flag, source, destination, summary):
+        self.flag = flag
+        self.source = source
+        self.destination = destination
+        self.summary, _, reason = summary.partition(" (")
+        self.reason = reason.rstrip(")") or None
+
+    @property
+    def ref(self):
+        return re.sub(r"^refs/(heads|tags)/", "", self.destination)
+
+    @property
+    def state(self):
+        return PUSH_FLAGS[self.flag]
+
+def batch_push_command(directory, refspecs, atomic=False, remote="origin"):
+    # Every ref in one invocation, so one connection and one ref advertisement
+    # for all of them. --atomic lets the server take all of them or none.
+    return ["git", "-C", directory, "push", "--porcelain", "--progress",
+            *(["--atomic"] if atomic else []), remote, *refspecs]
+
+def push_targets(upstreams, branches=(), tags=(), remote="origin"):
+    # remote -> refspecs. A branch goes to the branch it tracks on its
+    # upstream's remote (upstreams as from RefReader.upstream_refs), branches
+    # without an upstream and tags go to origin under their own name.
+    targets = {}
+    for branch in branches:
+        upstream_remote, merge = upstreams.get(branch, (remote, f"refs/heads/{branch}"))
+        targets.setdefault(upstream_remote, []).append(f"refs/heads/{branch}:{merge}")
+    for tag in tags:
+        targets.setdefault(remote, []).append(f"refs/tags/{tag}:refs/tags/{tag}")
+    return targets
+
+def push_pipeline(directory, targets, atomic=False):
+    # One git push per remote, a failing remote does not hold back the others
+    pipeline = Pipeline()
+    for remote, refspecs in targets.items():
+        name = "push" if len(targets) == 1 else f"push {remote}"
+        pipeline.add(name, batch_push_command(directory, refspecs, atomic, remote), depends_on=[])
+    return pipeline
+
+def parse_push_porcelain(output):
+    results = []
+    for line in output.splitlines():
+        match = PORCELAIN_LINE.match(line)
+        if match:
+            source, _, destination = match.group(2).partition(":")
+            results.append(PushResult(match.group(1), source, destination, match.group(3)))
+    return results
+
+def job_push_results(job):
+    return parse_push_porcelain("".join(job.captured or ()))
+
+def pending_branches(statuses):
+    # Branches with commits their upstream lacks. Diverged ones would be
+    # rejected as non-fast-forward, they are left for a pull first.
+    return [status.branch for status in statuses if status.state == "push"]
+
+def count_states(results):
+    counts = {}
+    for result in results:
+        counts[result.state] = counts.get(result.state, 0) + 1
+    return counts
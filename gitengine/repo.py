@@ -0,0 +1,290 @@
+import subprocess
+import threading
+import os
+import re
+
+class RepoInfo:
+    def __init__(self, worktree, git_dir, common_dir=None):
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.common_dir = common_dir or git_dir
+
+class RepoLocator:
+    # Finds the repository of a path without spawning git, results are
+    # cached until the mtime of one of the inspected paths changes
+    def __init__(self):
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def locate(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            cached = self.cache.get(path)
+        if cached and self.stamps_valid(cached[1]):
+            return cached[0]
+
+        stamps = []
+        try:
+            info = self.walk(path, stamps)
+        except LookupError:
+            info = self.ask_git(path)
+        with self.lock:
+            self.cache[path] = (info, stamps)
+        return info
+
+    def stamps_valid(self, stamps):
+        for entry, mtime in stamps:
+            try:
+                if os.stat(entry).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                if mtime is not None:
+                    return False
+        return True
+
+    def stamp(self, stamps, entry):
+        try:
+            st = os.stat(entry)
+        except OSError:
+            stamps.append((entry, None))
+            return None
+        stamps.append((entry, st.st_mtime_ns))
+        return st
+
+    def walk(self, path, stamps):
+        # LookupError means git's own rules are needed to get a reliable answer
+        if any(os.environ.get(key) for key in ("GIT_DIR", "GIT_WORK_TREE", "GIT_CEILING_DIRECTORIES")):
+            raise LookupError(path)
+        st = self.stamp(stamps, path)
+        if st is None:
+            return None
+        if ".git" in path.split(os.sep):
+            raise LookupError(path)
+
+        device = st.st_dev
+        current = path
+        while True:
+            if st.st_dev != device:
+                raise LookupError(path)
+            dot_git = os.path.join(current, ".git")
+            git_st = self.stamp(stamps, dot_git)
+            if git_st is not None:
+                return self.resolve(current, dot_git, stamps)
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+            st = self.stamp(stamps, current)
+            if st is None:
+                return None
+
+    def resolve(self, worktree, dot_git, stamps):
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+        else:
+            # Worktrees and submodules use a "gitdir: <path>" file
+            with open(dot_git, encoding="utf-8", errors="replace") as f:
+                content = f.read().strip()
+            if not content.startswith("gitdir:"):
+                raise LookupError(worktree)
+            git_dir = os.path.normpath(os.path.join(worktree, content[len("gitdir:"):].strip()))
+
+        if not os.path.isfile(os.path.join(git_dir, "HEAD")):
+            raise LookupError(worktree)
+        if hasattr(os, "getuid") and os.stat(git_dir).st_uid != os.getuid():
+            # git's safe.directory check may reject repositories of other users
+            raise LookupError(worktree)
+
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_file):
+            with open(commondir_file, encoding="utf-8", errors="replace") as f:
+                common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+        self.stamp(stamps, git_dir)
+        return RepoInfo(worktree, git_dir, common_dir)
+
+    def ask_git(self, path):
+        try:
+            result = subprocess.run(['git', '-C', path, 'rev-parse', '--is-inside-work-tree',
+                                     '--show-toplevel', '--absolute-git-dir', '--git-common-dir'],
+                                    check=True,
+                                    capture_output=True,
+                                    text=True)
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        lines = result.stdout.splitlines()
+        if len(lines) < 4 or lines[0] != "true":
+            return None
+        return RepoInfo(lines[1], lines[2], os.path.normpath(os.path.join(path, lines[3])))
+
+def read_git_config(path):
+    # Just enough of git's config format for remotes and branch tracking
+    config = {}
+    section = ""
+    try:
+        f = open(path, encoding="utf-8", errors="replace")
+    except OSError:
+        return config
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            match = re.match(r'\[([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\]', line)
+            if match:
+                section = match.group(1).lower()
+                if match.group(2) is not None:
+                    section += "." + match.group(2)
+                continue
+            key, _, value = line.partition("=")
+            value = re.sub(r'\s[#;].*$', "", value.strip()) if '"' not in value else value.strip()
+            config[f"{section}.{key.strip().lower()}"] = value.strip('"')
+    return config
+
+class RefSnapshot:
+    def __init__(self, head_branch, head_commit, local, remote, upstreams, tags=()):
+        self.head_branch = head_branch
+        self.head_commit = head_commit
+        self.local = local
+        self.remote = remote
+        self.upstreams = upstreams
+        self.tags = tags
+
+class RefReader:
+    # Reads HEAD, loose refs and packed-refs directly from disk
+    def __init__(self, info):
+        self.git_dir = info.git_dir
+        self.common_dir = info.common_dir
+
+    def head(self):
+        try:
+            with open(os.path.join(self.git_dir, "HEAD"), encoding="utf-8") as f:
+                content = f.read().strip()
+        except OSError:
+            return None, None
+        if content.startswith("ref:"):
+            ref = content[4:].strip()
+            branch = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+            return branch, self.resolve(ref)
+        return None, content
+
+    def loose_refs(self, prefix):
+        root = os.path.join(self.common_dir, *prefix.split("/"))
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif not entry.name.endswith(".lock"):
+                    name = prefix + os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    try:
+                        with open(entry.path, encoding="utf-8") as f:
+                            yield name, f.read().strip()
+                    except OSError:
+                        continue
+
+    def packed_refs(self, prefix=""):
+        # Streams packed-refs line by line, the file can hold millions of refs
+        try:
+            f = open(os.path.join(self.common_dir, "packed-refs"), encoding="utf-8", errors="replace")
+        except OSError:
+            return
+        with f:
+            sorted_refs = False
+            for line in f:
+                if line.startswith("#"):
+                    sorted_refs = " sorted" in line
+                    continue
+                if line.startswith("^"):
+                    continue
+                commit, _, name = line.rstrip("\n").partition(" ")
+                if name.startswith(prefix):
+                    yield name, commit
+                elif sorted_refs and name > prefix:
+                    return
+
+    def iter_refs(self, prefix):
+        seen = set()
+        for name, commit in self.loose_refs(prefix):
+            if commit.startswith("ref:"):
+                continue
+            seen.add(name)
+            yield name, commit
+        for name, commit in self.packed_refs(prefix):
+            if name not in seen:
+                yield name, commit
+
+    def resolve(self, ref):
+        try:
+            with open(os.path.join(self.common_dir, *ref.split("/")), encoding="utf-8") as f:
+                content = f.read().strip()
+            if content.startswith("ref:"):
+                return self.resolve(content[4:].strip())
+            return content
+        except OSError:
+            pass
+        for name, commit in self.packed_refs(ref):
+            if name == ref:
+                return commit
+        return None
+
+    def upstream_refs(self):
+        # branch -> (remote, ref on the remote), from branch.<b>.remote/merge
+        config = read_git_config(os.path.join(self.common_dir, "config"))
+        upstreams = {}
+        for key, remote in config.items():
+            if key.startswith("branch.") and key.endswith(".remote"):
+                branch = key[len("branch."):-len(".remote")]
+                merge = config.get(f"branch.{branch}.merge", "")
+                if merge.startswith("refs/heads/"):
+                    upstreams[branch] = (remote, merge)
+        return upstreams
+
+    def upstreams(self):
+        return {branch: f"{remote}/{merge[len('refs/heads/'):]}"
+                for branch, (remote, merge) in self.upstream_refs().items()}
+
+    def snapshot(self):
+        head_branch, head_commit = self.head()
+        local = sorted(name[len("refs/heads/"):] for name, _ in self.iter_refs("refs/heads/"))
+        remote = sorted(name[len("refs/remotes/"):] for name, _ in self.iter_refs("refs/remotes/")
+                        if not name.endswith("/HEAD"))
+        tags = sorted(name[len("refs/tags/"):] for name, _ in self.iter_refs("refs/tags/"))
+        return RefSnapshot(head_branch, head_commit, local, remote, self.upstreams(), tags)
+
+class RefCache:
+    # Keeps ref snapshots until HEAD, packed-refs, config or a refs directory changes
+    def __init__(self):
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def signature(self, info):
+        paths = [os.path.join(info.git_dir, "HEAD"),
+                 os.path.join(info.common_dir, "packed-refs"),
+                 os.path.join(info.common_dir, "config")]
+        for top in ("heads", "remotes", "tags"):
+            for directory, _, _ in os.walk(os.path.join(info.common_dir, "refs", top)):
+                paths.append(directory)
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(zip(paths, stamps))
+
+    def get(self, info):
+        signature = self.signature(info)
+        with self.lock:
+            cached = self.cache.get(info.git_dir)
+        if cached and cached[0] == signature:
+            return cached[1]
+        snapshot = RefReader(info).snapshot()
+        with self.lock:
+            self.cache[info.git_dir] = (signature, snapshot)
+        return snapshot
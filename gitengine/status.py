@@ -0,0 +1,174 @@
+import subprocess
+import sys
+from array import array
+
+class PathStore:
+    # Compact backing store for big change lists: directory prefixes are
+    # interned once and per-file data lives in arrays instead of objects
+    SORT_KEYS = ("path", "name", "status")
+
+    def __init__(self):
+        self.dirs = []
+        self.dir_ids = {}
+        self.codes = []
+        self.code_ids = {}
+        self.names = []
+        self.entry_dirs = array("I")
+        self.entry_codes = array("B")
+        self.checked = bytearray()
+        self.renames = {}
+        self.view = array("I")
+        self.filter_text = ""
+        self.sort_key = "path"
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, table, ids, value):
+        if value not in ids:
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    def add(self, path, code="", checked=False, orig_path=None):
+        directory, _, name = path.rpartition("/")
+        index = len(self.names)
+        self.names.append(sys.intern(name))
+        self.entry_dirs.append(self.intern(self.dirs, self.dir_ids, directory))
+        self.entry_codes.append(self.intern(self.codes, self.code_ids, code))
+        self.checked.append(1 if checked else 0)
+        if orig_path:
+            self.renames[index] = orig_path
+        if self.matches(index):
+            self.view.append(index)
+        return index
+
+    def path(self, index):
+        directory = self.dirs[self.entry_dirs[index]]
+        return f"{directory}/{self.names[index]}" if directory else self.names[index]
+
+    def code(self, index):
+        return self.codes[self.entry_codes[index]]
+
+    def matches(self, index):
+        return not self.filter_text or self.filter_text in self.path(index).lower()
+
+    def apply(self, filter_text=None, sort_key=None):
+        # Only the view of indices is rebuilt, the stored entries stay as they are
+        if filter_text is not None:
+            self.filter_text = filter_text.lower()
+        if sort_key is not None:
+            self.sort_key = sort_key
+        indices = [i for i in range(len(self.names)) if self.matches(i)]
+        if self.sort_key == "name":
+            indices.sort(key=lambda i: (self.names[i].lower(), self.dirs[self.entry_dirs[i]]))
+        elif self.sort_key == "status":
+            indices.sort(key=lambda i: (self.codes[self.entry_codes[i]], self.dirs[self.entry_dirs[i]], self.names[i]))
+        else:
+            indices.sort(key=lambda i: (self.dirs[self.entry_dirs[i]], self.names[i]))
+        self.view = array("I", indices)
+
+    def without(self, paths):
+        # Copy without the entries at or below paths, so that the result of a
+        # status scan limited to those paths can be added on top
+        store = PathStore()
+        store.filter_text, store.sort_key = self.filter_text, self.sort_key
+        prefixes = tuple(f"{path}/" for path in paths)
+        paths = set(paths)
+        for index in range(len(self.names)):
+            path = self.path(index)
+            if path not in paths and not path.startswith(prefixes):
+                store.add(path, self.code(index), self.checked[index], self.renames.get(index))
+        return store
+
+    def toggle(self, index):
+        self.checked[index] ^= 1
+
+    def checked_paths(self):
+        for index, checked in enumerate(self.checked):
+            if checked:
+                yield self.path(index)
+
+class StatusEntry:
+    def __init__(self, path, kind, index=".", worktree=".", orig_path=None):
+        self.path = path
+        self.kind = kind
+        self.index = index
+        self.worktree = worktree
+        self.orig_path = orig_path
+
+    @property
+    def code(self):
+        if self.kind == "untracked":
+            return "??"
+        return self.index + self.worktree
+
+    @property
+    def staged(self):
+        return self.index not in ".?"
+
+class StatusScanner:
+    # Streams `git status --porcelain=v2 -z` without buffering the whole output
+    FIELDS = {"1": 8, "2": 9, "u": 10}
+
+    def __init__(self, directory, chunk_size=65536, paths=None):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.paths = paths
+        self.branch = {}
+        self.returncode = None
+        self.process = None
+
+    def command(self):
+        # The untracked cache is stored in the index, so later scans only
+        # have to look at directories that changed. A configured fsmonitor
+        # (core.fsmonitor) is picked up by git on its own.
+        # With paths only those are looked at, literally: names are not globs.
+        pathspecs = ["--", *self.paths] if self.paths else []
+        return ["git", "-C", self.directory, "--literal-pathspecs", "-c", "core.untrackedCache=true",
+                "status", "--porcelain=v2", "-z", "--branch", "--untracked-files=all", *pathspecs]
+
+    def records(self):
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        pending = b""
+        try:
+            while True:
+                chunk = self.process.stdout.read1(self.chunk_size)
+                if not chunk:
+                    break
+                records = (pending + chunk).split(b"\0")
+                pending = records.pop()
+                for record in records:
+                    yield record.decode("utf-8", "surrogateescape")
+            if pending:
+                yield pending.decode("utf-8", "surrogateescape")
+        finally:
+            self.process.stdout.close()
+            self.returncode = self.process.wait()
+
+    def scan(self):
+        records = self.records()
+        for record in records:
+            kind = record[:1]
+            if kind == "#":
+                key, _, value = record[2:].partition(" ")
+                self.branch[key] = value
+            elif kind in self.FIELDS:
+                fields = record.split(" ", self.FIELDS[kind])
+                xy, path = fields[1], fields[-1]
+                if kind == "2":
+                    # Renames are followed by the original path as its own record
+                    yield StatusEntry(path, "renamed", xy[0], xy[1], next(records, None))
+                else:
+                    yield StatusEntry(path, "unmerged" if kind == "u" else "changed", xy[0], xy[1])
+            elif kind == "?":
+                yield StatusEntry(record[2:], "untracked", "?", "?")
+            elif kind == "!":
+                yield StatusEntry(record[2:], "ignored", "!", "!")
+
+    def ahead_behind(self):
+        ab = self.branch.get("branch.ab")
+        if not ab:
+            return None
+        ahead, behind = ab.split()
+        return int(ahead), abs(int(behind))
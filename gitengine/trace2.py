@@ -0,0 +1,112 @@
+import json
+import os
+
+from .config import user_cache_dir
+from .objcache import strip_credentials
+
+def default_trace_dir():
+    # Per user, not a predictable name in the shared temp dir: git writes
+    # full command lines and environment details into the trace files
+    return user_cache_dir("trace")
+
+def command_line(argv):
+    # Remote URLs may carry user:token@, reports end up in the console and metrics.jsonl
+    return " ".join(strip_credentials(arg) for arg in argv)
+
+def prune_traces(directory, keep=100):
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".json")]
+    except OSError:
+        return
+    paths = sorted((os.path.join(directory, name) for name in names), key=os.path.getmtime)
+    for path in paths[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class Trace2Report:
+    # Where the time of a job went, read from git's GIT_TRACE2_EVENT stream.
+    # Every git process of the job appends to the same file, sids of child
+    # processes are prefixed with the sid of their parent.
+    def __init__(self, path):
+        self.path = path
+        self.commands = []
+        self.regions = {}
+        self.children = []
+        self.data = {}
+
+    @classmethod
+    def parse(cls, path):
+        report = cls(path)
+        processes = {}
+        started = {}
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                kind = event.get("event")
+                sid = event.get("sid", "")
+                if kind == "start":
+                    processes[sid] = {"command": command_line(event.get("argv", [])), "depth": sid.count("/"),
+                                      "duration": None, "code": None}
+                elif kind == "exit" and sid in processes:
+                    processes[sid]["duration"] = event.get("t_abs")
+                    processes[sid]["code"] = event.get("code")
+                elif kind == "region_leave":
+                    key = (event.get("nesting", 1), event.get("category", ""), event.get("label", ""))
+                    count, seconds = report.regions.get(key, (0, 0.0))
+                    report.regions[key] = (count + 1, seconds + event.get("t_rel", 0.0))
+                elif kind == "child_start":
+                    started[(sid, event.get("child_id"))] = (command_line(event.get("argv", [])),
+                                                              event.get("child_class", ""))
+                elif kind == "child_exit":
+                    argv, child_class = started.pop((sid, event.get("child_id")), ("?", ""))
+                    report.children.append({"command": argv, "class": child_class,
+                                            "duration": event.get("t_rel"), "code": event.get("code")})
+                elif kind == "data":
+                    value = event.get("value")
+                    report.data[f"{event.get('category', '')}/{event.get('key', '')}"] = (
+                        strip_credentials(value) if isinstance(value, str) else value)
+        report.commands = list(processes.values())
+        return report
+
+    @property
+    def duration(self):
+        return sum(command["duration"] or 0.0 for command in self.commands if command["depth"] == 0)
+
+    def phases(self, limit=10):
+        ranked = sorted(self.regions.items(), key=lambda item: -item[1][1])[:limit]
+        return [{"region": f"{category}/{label}", "nesting": nesting, "count": count, "seconds": round(seconds, 3)}
+                for (nesting, category, label), (count, seconds) in ranked]
+
+    def as_dict(self):
+        return {
+            "file": self.path,
+            "duration": round(self.duration, 3),
+            "phases": self.phases(),
+            "children": [dict(child, duration=round(child["duration"] or 0.0, 3))
+                         for child in sorted(self.children, key=lambda child: -(child["duration"] or 0.0))[:10]],
+            "data": self.data
+        }
+
+    def describe(self, limit=10):
+        lines = [f"Trace breakdown ({self.path}):\n"]
+        for command in self.commands:
+            duration = "?" if command["duration"] is None else f"{command['duration']:.3f}s"
+            lines.append(f"  {'  ' * command['depth']}{command['command'][:80]}  {duration}\n")
+        if self.regions:
+            lines.append("  Phases:\n")
+            for phase in self.phases(limit):
+                count = f" x{phase['count']}" if phase["count"] > 1 else ""
+                lines.append(f"    {'  ' * (phase['nesting'] - 1)}{phase['region']}{count}  {phase['seconds']:.3f}s\n")
+        if self.children:
+            lines.append("  Child processes:\n")
+            for child in sorted(self.children, key=lambda child: -(child["duration"] or 0.0))[:limit]:
+                lines.append(f"    [{child['class']}] {child['command'][:70]}  "
+                             f"{child['duration'] or 0.0:.3f}s exit {child['code']}\n")
+        if self.data:
+            lines.append("  Data: " + ", ".join(f"{key}={value}" for key, value in self.data.items()) + "\n")
+        return lines
@@ -0,0 +1,400 @@
+import threading
+import platform
+import select
+import struct
+import errno
+import time
+import os
+
+class RepoWatcher:
+    # Watches a working tree and its git directory and reports which parts
+    # changed ("files", "branch", "refs") once events have settled, together
+    # with the changed worktree paths. The paths are None when they are not
+    # known (queue overflow, index rewritten), then everything has to be rescanned.
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+    FILE_LIST_DIRECTORY = 0x1
+    FILE_SHARE_ALL = 0x7
+    OPEN_EXISTING = 3
+    FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+    FILE_FLAG_OVERLAPPED = 0x40000000
+    FILE_NOTIFY_CHANGE = 0x1 | 0x2 | 0x8 | 0x10 | 0x40  # file name, dir name, size, last write, creation
+    WAIT_TIMEOUT = 0x102
+    ERROR_NOTIFY_ENUM_DIR = 1022
+
+    def __init__(self, info, callback, debounce=0.3, poll_interval=2.0, poll_batch=2000):
+        self.info = info
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.poll_batch = poll_batch
+        self.tree = {}
+        self.queue = []
+        self.pending = set()
+        self.paths = set()
+        self.resync = False
+        self.last_event = 0.0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.muted_index_until = 0.0
+        self.backend = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def mute_index(self, seconds):
+        # Our own `git status` refreshes the index, that must not trigger another scan
+        self.muted_index_until = time.time() + seconds
+
+    def classify(self, path):
+        git_dirs = {self.info.git_dir, self.info.common_dir}
+        name = os.path.basename(path)
+        if name.endswith(".lock"):
+            return None
+        if path in git_dirs:
+            return None
+        parent = os.path.dirname(path)
+        if parent in git_dirs:
+            if name == "HEAD":
+                return "branch"
+            if name == "index":
+                return None if time.time() < self.muted_index_until else "files"
+            if name == "packed-refs":
+                return "refs"
+            return None
+        for git_dir in git_dirs:
+            if path.startswith(os.path.join(git_dir, "refs", "")):
+                return "refs"
+            if path.startswith(os.path.join(git_dir, "")):
+                return None
+        return "files"
+
+    def relative(self, path):
+        # None for the index and anything else that does not name a worktree path
+        if path is None or any(path.startswith(os.path.join(git_dir, ""))
+                               for git_dir in (self.info.git_dir, self.info.common_dir)):
+            return None
+        relative = os.path.relpath(path, self.info.worktree)
+        if relative == os.curdir or relative.startswith(os.pardir):
+            return None
+        return relative.replace(os.sep, "/")
+
+    def record(self, aspect, path=None):
+        if aspect:
+            with self.lock:
+                self.pending.add(aspect)
+                if aspect == "files":
+                    relative = self.relative(path)
+                    if relative is None:
+                        self.resync = True
+                    else:
+                        self.paths.add(relative)
+                self.last_event = time.time()
+
+    def flush(self, force=False):
+        with self.lock:
+            if not self.pending or (not force and time.time() - self.last_event < self.debounce):
+                return
+            aspects, self.pending = self.pending, set()
+            paths = None if self.resync else self.paths
+            self.paths, self.resync = set(), False
+        self.callback(aspects, paths)
+
+    def record_all(self):
+        for aspect in ("files", "branch", "refs"):
+            self.record(aspect)
+
+    def run(self):
+        backend = {"Linux": self.run_inotify, "Windows": self.run_windows}.get(platform.system())
+        if backend:
+            try:
+                backend()
+                return
+            except OSError:
+                # e.g. fs.inotify.max_user_watches exhausted, or a network
+                # share that does not support change notifications
+                pass
+        self.run_polling()
+
+    def watch_dirs(self):
+        yield self.info.git_dir
+        if self.info.common_dir != self.info.git_dir:
+            yield self.info.common_dir
+        for top in ("heads", "remotes", "tags"):
+            for directory, _, _ in os.walk(os.path.join(self.info.common_dir, "refs", top)):
+                yield directory
+        for directory, dirs, _ in os.walk(self.info.worktree):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            yield directory
+
+    def run_inotify(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        watches = {}
+
+        def add_watch(directory):
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached")
+                return
+            watches[wd] = directory
+
+        try:
+            for directory in self.watch_dirs():
+                add_watch(directory)
+            header = struct.calcsize("iIII")
+            while not self.stopped.is_set():
+                readable, _, _ = select.select([fd], [], [], self.debounce / 2)
+                if readable:
+                    data = os.read(fd, 65536)
+                    offset = 0
+                    while offset < len(data):
+                        wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+                        name = data[offset + header:offset + header + length].rstrip(b"\0")
+                        offset += header + length
+                        if mask & self.IN_Q_OVERFLOW:
+                            self.record_all()
+                            continue
+                        directory = watches.get(wd)
+                        if directory is None:
+                            continue
+                        path = os.path.join(directory, os.fsdecode(name))
+                        if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                            if self.classify(path) in ("files", "refs"):
+                                for sub, dirs, _ in os.walk(path):
+                                    dirs[:] = [d for d in dirs if d != ".git"]
+                                    add_watch(sub)
+                        self.record(self.classify(path), path)
+                self.flush()
+        finally:
+            os.close(fd)
+
+    def watch_roots(self):
+        # The working tree, plus git directories that live outside of it
+        # (linked worktrees, --separate-git-dir)
+        roots = [self.info.worktree]
+        for git_dir in (self.info.git_dir, self.info.common_dir):
+            inside = os.path.normcase(os.path.join(git_dir, ""))
+            if not any(inside.startswith(os.path.normcase(os.path.join(root, ""))) for root in roots):
+                roots.append(git_dir)
+        return roots
+
+    def run_windows(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class OVERLAPPED(ctypes.Structure):
+            _fields_ = [("Internal", ctypes.c_void_p), ("InternalHigh", ctypes.c_void_p),
+                        ("Offset", wintypes.DWORD), ("OffsetHigh", wintypes.DWORD), ("hEvent", wintypes.HANDLE)]
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                         wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        kernel32.CreateEventW.restype = wintypes.HANDLE
+        kernel32.CreateEventW.argtypes = [wintypes.LPVOID, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+        kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, wintypes.BOOL,
+                                                   wintypes.DWORD, wintypes.LPDWORD, ctypes.POINTER(OVERLAPPED),
+                                                   wintypes.LPVOID]
+        kernel32.GetOverlappedResult.argtypes = [wintypes.HANDLE, ctypes.POINTER(OVERLAPPED), wintypes.LPDWORD,
+                                                 wintypes.BOOL]
+        kernel32.WaitForMultipleObjects.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.BOOL,
+                                                    wintypes.DWORD]
+        kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        kernel32.ResetEvent.argtypes = [wintypes.HANDLE]
+        kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, wintypes.LPVOID]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        invalid = wintypes.HANDLE(-1).value
+
+        # One recursive ReadDirectoryChangesW per root instead of a watch per
+        # directory, overlapped so the thread can still notice stop()
+        watches = []
+
+        def read(watch):
+            root, handle, overlapped, buffer = watch
+            kernel32.ResetEvent(overlapped.hEvent)
+            if not kernel32.ReadDirectoryChangesW(handle, buffer, ctypes.sizeof(buffer), True,
+                                                  self.FILE_NOTIFY_CHANGE, None, ctypes.byref(overlapped), None):
+                raise ctypes.WinError(ctypes.get_last_error())
+
+        try:
+            for root in self.watch_roots():
+                handle = kernel32.CreateFileW(root, self.FILE_LIST_DIRECTORY, self.FILE_SHARE_ALL, None,
+                                              self.OPEN_EXISTING,
+                                              self.FILE_FLAG_BACKUP_SEMANTICS | self.FILE_FLAG_OVERLAPPED, None)
+                if handle in (None, invalid):
+                    raise ctypes.WinError(ctypes.get_last_error())
+                overlapped = OVERLAPPED()
+                overlapped.hEvent = kernel32.CreateEventW(None, True, False, None)
+                # DWORD aligned, as FILE_NOTIFY_INFORMATION requires
+                watch = (root, handle, overlapped, (wintypes.DWORD * 16384)())
+                watches.append(watch)
+                read(watch)
+            events = (wintypes.HANDLE * len(watches))(*(watch[2].hEvent for watch in watches))
+            while not self.stopped.is_set():
+                index = kernel32.WaitForMultipleObjects(len(watches), events, False, int(self.debounce * 500))
+                if index < len(watches):
+                    root, handle, overlapped, buffer = watches[index]
+                    size = wintypes.DWORD()
+                    if not kernel32.GetOverlappedResult(handle, ctypes.byref(overlapped), ctypes.byref(size), False):
+                        error = ctypes.get_last_error()
+                        if error != self.ERROR_NOTIFY_ENUM_DIR:
+                            raise ctypes.WinError(error)
+                        size.value = 0
+                    if not size.value:
+                        # More changes than fit into the buffer
+                        self.record_all()
+                    data = ctypes.string_at(buffer, size.value)
+                    offset = 0
+                    while offset < len(data):
+                        next_offset, _, length = struct.unpack_from("III", data, offset)
+                        name = data[offset + 12:offset + 12 + length].decode("utf-16-le")
+                        path = os.path.join(root, name)
+                        self.record(self.classify(path), path)
+                        if not next_offset:
+                            break
+                        offset += next_offset
+                    read(watches[index])
+                elif index != self.WAIT_TIMEOUT:
+                    raise ctypes.WinError(ctypes.get_last_error())
+                self.flush()
+        finally:
+            for _, handle, overlapped, _ in watches:
+                kernel32.CancelIoEx(handle, None)
+                kernel32.CloseHandle(handle)
+                kernel32.CloseHandle(overlapped.hEvent)
+
+    def scan(self, directory):
+        # Stamps of the files in one directory. Subdirectories not seen before
+        # are scanned as well, known ones keep their own entry in self.tree.
+        try:
+            stamp = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            self.forget(directory)
+            return
+        files = {}
+        listed = set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    listed.add(entry.path)
+                    if entry.name != ".git" and entry.path not in self.tree:
+                        self.scan(entry.path)
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        self.tree[directory] = (stamp, files)
+        for known in [known for known in self.tree if os.path.dirname(known) == directory and known != directory]:
+            if known not in listed:
+                self.forget(known)
+
+    def entries(self, directory):
+        # Files of a polled directory with their stamps, subdirectories as "dir"
+        entries = dict(self.tree.get(directory, (None, {}))[1])
+        for known in self.tree:
+            if os.path.dirname(known) == directory and known != directory:
+                entries[os.path.basename(known)] = "dir"
+        return entries
+
+    def forget(self, directory):
+        prefix = os.path.join(directory, "")
+        for known in [known for known in self.tree if known == directory or known.startswith(prefix)]:
+            del self.tree[known]
+
+    def state_files(self):
+        stamps = {}
+        for git_dir in {self.info.git_dir, self.info.common_dir}:
+            for name in ("HEAD", "index", "packed-refs"):
+                path = os.path.join(git_dir, name)
+                try:
+                    stamps[path] = os.stat(path).st_mtime_ns
+                except OSError:
+                    pass
+        return stamps
+
+    def poll(self, previous):
+        # Directory stamps every cycle: added, removed and renamed entries
+        # (and editors that save by renaming) show up right away, and only the
+        # changed directory is listed again. Files are stat'ed poll_batch at a
+        # time in rotation, so an edit in place is seen within a few cycles
+        # without walking the whole tree every time.
+        current = self.state_files()
+        for path in set(previous) | set(current):
+            if previous.get(path) != current.get(path):
+                self.record(self.classify(path))
+        for directory, (stamp, _) in list(self.tree.items()):
+            if directory not in self.tree:
+                continue
+            aspect = self.classify(os.path.join(directory, ""))
+            try:
+                changed = os.stat(directory).st_mtime_ns != stamp
+            except OSError:
+                # Gone with everything below it
+                self.forget(directory)
+                self.record(aspect, directory)
+                continue
+            if changed:
+                # Listing the directory again tells which of its entries came,
+                # went or changed, those are what gets reported
+                before = self.entries(directory)
+                self.scan(directory)
+                after = self.entries(directory)
+                if aspect != "files":
+                    self.record(aspect)
+                    continue
+                for name in set(before) | set(after):
+                    if before.get(name) != after.get(name):
+                        self.record(aspect, os.path.join(directory, name))
+        if not self.queue:
+            self.queue = [(directory, name) for directory, (_, files) in self.tree.items() for name in files]
+        batch, self.queue = self.queue[-self.poll_batch:], self.queue[:-self.poll_batch]
+        for directory, name in batch:
+            files = self.tree.get(directory, (None, {}))[1]
+            if name not in files:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path, follow_symlinks=False)
+            except OSError:
+                # Removed, the directory stamp reports that
+                continue
+            if (stat.st_mtime_ns, stat.st_size) != files[name]:
+                files[name] = (stat.st_mtime_ns, stat.st_size)
+                self.record(self.classify(path), path)
+        return current
+
+    def run_polling(self):
+        for top in ("heads", "remotes", "tags"):
+            self.scan(os.path.join(self.info.common_dir, "refs", top))
+        self.scan(self.info.worktree)
+        previous = self.state_files()
+        while not self.stopped.wait(self.poll_interval):
+            previous = self.poll(previous)
+            self.flush(force=True)
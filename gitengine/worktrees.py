@@ -0,0 +1,82 @@
+import subprocess
+import re
+import os
+
+class Worktree:
+    def __init__(self, path):
+        self.path = path
+        self.head = None
+        self.branch = None
+        self.bare = False
+        self.detached = False
+        self.locked = None
+        self.prunable = None
+
+    @property
+    def state(self):
+        if self.prunable is not None:
+            return "prunable"
+        if self.locked is not None:
+            return "locked"
+        if self.bare:
+            return "bare"
+        return "detached" if self.detached else ""
+
+def parse_worktrees(output):
+    # `git worktree list --porcelain`: one block per worktree, blank line separated
+    worktrees = []
+    current = None
+    for line in output.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "worktree":
+            current = Worktree(os.path.normpath(value))
+            worktrees.append(current)
+        elif current is None:
+            continue
+        elif key == "HEAD":
+            current.head = value
+        elif key == "branch":
+            current.branch = value[len("refs/heads/"):] if value.startswith("refs/heads/") else value
+        elif key == "bare":
+            current.bare = True
+        elif key == "detached":
+            current.detached = True
+        elif key == "locked":
+            current.locked = value
+        elif key == "prunable":
+            current.prunable = value
+    return worktrees
+
+def list_worktrees(directory):
+    result = subprocess.run(["git", "-C", directory, "worktree", "list", "--porcelain"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise ValueError(result.stderr.decode("utf-8", "replace").strip() or "git worktree list failed")
+    return parse_worktrees(result.stdout.decode("utf-8", "surrogateescape"))
+
+def worktree_path(main_worktree, branch):
+    # Next to the main checkout: /src/app + feature/login -> /src/app-feature-login
+    name = re.sub(r"[^A-Za-z0-9._-]+", "-", branch).strip("-.") or "worktree"
+    return f"{os.path.normpath(main_worktree)}-{name}"
+
+def local_branch(branch, refs):
+    # The branch box offers remote-only branches as origin/<name>
+    return branch.split("/", 1)[1] if branch in refs.remote else branch
+
+def add_worktree_command(directory, path, branch, refs):
+    # refs is the RefSnapshot of the repository, it decides between checking
+    # out a local branch, tracking a remote one and starting a new branch
+    remote = branch if branch in refs.remote else None
+    local = local_branch(branch, refs)
+    if local in refs.local:
+        return ["git", "-C", directory, "worktree", "add", path, local]
+    if remote or f"origin/{local}" in refs.remote:
+        return ["git", "-C", directory, "worktree", "add", "--track", "-b", local, path,
+                remote or f"origin/{local}"]
+    return ["git", "-C", directory, "worktree", "add", "-b", local, path]
+
+def remove_worktree_command(directory, path, force=False):
+    return ["git", "-C", directory, "worktree", "remove", *(["--force"] if force else []), path]
+
+def prune_worktrees_command(directory):
+    return ["git", "-C", directory, "worktree", "prune", "--verbose"]
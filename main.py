@@ -1,14 +1,109 @@
+import time
+PROCESS_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
+from tkinter import font as tkfont
 from tkinter import Toplevel
-import subprocess
 import threading
+import queue
 import platform
-import json
 import sys
 import os
 
+from gitengine.config import load_config, save_config, user_cache_dir
+from gitengine.divergence import AheadBehind
+from gitengine.fetcher import BackgroundFetcher, can_pull_locally
+from gitengine.index import changed_files
+from gitengine.jobs import Job, JobScheduler, OutputBuffer, Pipeline, format_bytes
+from gitengine.metrics import MetricsStore
+from gitengine.objcache import ObjectCache
+from gitengine.operations import (CACHED_STRATEGIES, CLONE_STRATEGIES, PULL_STRATEGIES, bulk_command, clone_pipeline,
+                                  commit_pipeline, git_auth_env, pull_pipeline, push_command, upgrade_pipeline)
+from gitengine.push import count_states, job_push_results, pending_branches, push_pipeline, push_targets
+from gitengine.repo import RefCache, RefReader, RepoLocator
+from gitengine.status import PathStore, StatusScanner
+from gitengine.trace2 import default_trace_dir
+from gitengine.watcher import RepoWatcher
+from gitengine.worktrees import (add_worktree_command, list_worktrees, local_branch, prune_worktrees_command,
+                                 remove_worktree_command, worktree_path)
+
+class VirtualList(tk.Frame):
+    # Listbox that only materializes the rows currently on screen
+    def __init__(self, master, store, render, **options):
+        super().__init__(master, bg=options.get("bg"))
+        self.store = store
+        self.render = render
+        self.top = 0
+        self.listbox = tk.Listbox(self, activestyle="none", selectmode=tk.EXTENDED, **options)
+        self.scrollbar = ttk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+
+        self.listbox.bind("<Configure>", lambda event: self.refresh())
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+        self.listbox.bind("<Up>", lambda event: self.move(-1))
+        self.listbox.bind("<Down>", lambda event: self.move(1))
+        self.listbox.bind("<Prior>", lambda event: self.scroll(-self.rows()))
+        self.listbox.bind("<Next>", lambda event: self.scroll(self.rows()))
+
+    def bind_rows(self, sequence, callback):
+        self.listbox.bind(sequence, callback)
+
+    def rows(self):
+        return max(1, self.listbox.winfo_height() // self.line_height)
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.store.view)))
+        elif args[0] == "scroll":
+            amount = int(args[1]) * (self.rows() if args[2] == "pages" else 1)
+            self.scroll(amount)
+
+    def scroll(self, amount):
+        self.scroll_to(self.top + amount)
+        return "break"
+
+    def scroll_to(self, top):
+        selected = self.selected()
+        self.top = max(0, min(top, len(self.store.view) - self.rows()))
+        self.refresh(selected)
+
+    def move(self, step):
+        selection = self.listbox.curselection()
+        row = (selection[0] if selection else 0) + step
+        if row < 0 or row >= self.rows():
+            self.scroll(step)
+            row = max(0, min(row, self.rows() - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(row)
+        self.listbox.activate(row)
+        return "break"
+
+    def refresh(self, selected=None):
+        view = self.store.view
+        if selected is None:
+            selected = self.selected()
+        self.top = max(0, min(self.top, len(view) - self.rows()))
+        visible = view[self.top:self.top + self.rows()]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *[self.render(index) for index in visible])
+        for row, index in enumerate(visible):
+            if index in selected:
+                self.listbox.selection_set(row)
+        if view:
+            self.scrollbar.set(self.top / len(view), (self.top + len(visible)) / len(view))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def selected(self):
+        view = self.store.view
+        return [view[self.top + row] for row in self.listbox.curselection() if self.top + row < len(view)]
+
 class Tooltip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -46,9 +141,865 @@ def resource_path(self, relative_path):
 
     return os.path.join(base_path, relative_path)
 
+class StartupProfile:
+    # Timing breakdown for --profile-startup, measured from the first line of main.py
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.last = PROCESS_START
+        self.marks = []
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.marks.append((label, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        for label, seconds in self.marks:
+            print(f"{label:<24}{seconds * 1000:8.1f} ms")
+        print(f"{'total':<24}{(self.last - PROCESS_START) * 1000:8.1f} ms")
+        sys.stdout.flush()
+
+class ConsoleSink:
+    # Drains an OutputBuffer into a Text widget from the Tk main loop
+    def __init__(self, root, text, max_lines=5000, interval=50):
+        self.root = root
+        self.text = text
+        self.max_lines = max_lines
+        self.interval = interval
+        self.buffer = OutputBuffer(max_lines)
+        self.root.after(self.interval, self.flush)
+
+    def write(self, text):
+        self.buffer.write(text)
+
+    def clear(self):
+        self.buffer.clear()
+
+    def flush(self):
+        try:
+            cleared, dropped, lines = self.buffer.drain()
+            if cleared:
+                self.text.delete(1.0, tk.END)
+            if dropped:
+                lines.insert(0, f"... {dropped} lines skipped ...\n")
+            if lines:
+                self.text.insert(tk.END, "".join(lines))
+                # Ring buffer: only the newest max_lines stay in the widget
+                excess = int(self.text.index("end-1c").split(".")[0]) - self.max_lines
+                if excess > 0:
+                    self.text.delete(1.0, f"{excess + 1}.0")
+                self.text.see(tk.END)
+        finally:
+            self.root.after(self.interval, self.flush)
+
+class GroupCloneWindow:
+    def __init__(self, app):
+        self.app = app
+        self.projects = {}
+        self.rows = {}
+        self.jobs = []
+
+        self.window = Toplevel(app.root)
+        self.window.title("Clone GitLab Group")
+        self.window.geometry("900x550")
+        self.window.configure(bg=app.colors["background"])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(toolbar, text="Group:", style="TLabel").pack(side=tk.LEFT)
+        self.group = tk.StringVar(value=app.settings["gitlab_group"])
+        ttk.Entry(toolbar, textvariable=self.group, style="TEntry", width=40).pack(side=tk.LEFT, padx=5)
+        self.load_button = ttk.Button(toolbar,
+                                      text="Load Projects",
+                                      style="Accent.TButton",
+                                      command=self.load_projects)
+        self.load_button.pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar,
+                   text="Clone Selected",
+                   style="Accent.TButton",
+                   command=self.clone_selected).pack(side=tk.RIGHT, padx=2)
+
+        columns = ("project", "branch", "state", "duration")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings", selectmode="extended")
+        for column, width in zip(columns, (420, 120, 100, 80)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column == "project")
+        self.tree.tag_configure("failed", foreground="#ed4245")
+        self.tree.tag_configure("done", foreground="#3ba55d")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window,
+                                 text=f"Clones go into {app.vars['local_dir'].get() or '(set Local Directory)'}",
+                                 style="TLabel",
+                                 padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+
+    def load_projects(self):
+        group = self.group.get().strip()
+        if not group:
+            messagebox.showerror("Error", "Enter a group path", parent=self.window)
+            return
+        self.app.settings["gitlab_group"] = group
+        self.load_button.state(["disabled"])
+        self.summary.config(text="Loading projects...")
+        client = self.app.gitlab_client()
+
+        def worker():
+            try:
+                projects = list(client.group_projects(group))
+                self.app.call_in_ui(self.show_projects, projects)
+            except Exception as e:
+                self.app.call_in_ui(self.show_error, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def close(self):
+        # Idle keep-alive connections to GitLab are not needed until the next listing
+        if self.app.client:
+            self.app.client.close()
+        self.window.destroy()
+
+    def show_error(self, message):
+        self.load_button.state(["!disabled"])
+        self.summary.config(text="Loading projects failed")
+        messagebox.showerror("Error", message, parent=self.window)
+
+    def show_projects(self, projects):
+        self.load_button.state(["!disabled"])
+        self.tree.delete(*self.tree.get_children())
+        self.projects = {}
+        self.rows = {}
+        for project in projects:
+            path = project["path_with_namespace"]
+            self.projects[path] = project
+            self.rows[path] = self.tree.insert("", tk.END,
+                                               values=(path, project.get("default_branch") or "", "", ""))
+        self.summary.config(text=f"{len(projects)} projects in {self.group.get()}")
+
+    def clone_selected(self):
+        base_dir = self.app.vars["local_dir"].get()
+        if not base_dir:
+            messagebox.showerror("Error", "Set Local Directory as clone target", parent=self.window)
+            return
+        group = self.group.get().strip().strip("/")
+        self.jobs = []
+        for item in self.tree.selection():
+            path = self.tree.item(item, "values")[0]
+            project = self.projects[path]
+            # Keep the subgroup layout below the group
+            relative = path[len(group) + 1:] if path.startswith(group + "/") else project["path"]
+            directory = os.path.join(base_dir, *relative.split("/"))
+            if os.path.exists(directory):
+                self.tree.item(item, values=(path, project.get("default_branch") or "", "exists", ""))
+                continue
+            job = self.app.clone_job(project["http_url_to_repo"], directory, project.get("default_branch"))
+            if job is None:
+                return
+            job.project = path
+            self.jobs.append(job)
+            self.app.bulk_scheduler.submit(job)
+
+    def update_job(self, job):
+        if job not in self.jobs:
+            return
+        project = self.projects[job.project]
+        self.tree.item(self.rows[job.project],
+                       values=(job.project, project.get("default_branch") or "", job.state, f"{job.elapsed:.1f}s"),
+                       tags=(job.state,))
+        finished = [j for j in self.jobs if j.state in ("done", "failed", "cancelled")]
+        failed = [j for j in finished if j.state != "done"]
+        self.summary.config(text=f"{len(finished)}/{len(self.jobs)} clones finished, {len(failed)} failed")
+
+class WorkspaceWindow:
+    def __init__(self, app):
+        self.app = app
+        self.rows = {}
+        self.changes = {}
+        self.batch = []
+        self.batch_started = None
+
+        self.window = Toplevel(app.root)
+        self.window.title("Workspace")
+        self.window.geometry("900x500")
+        self.window.configure(bg=app.colors["background"])
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        buttons = [
+            ("Add Repo", self.add_repo),
+            ("Add Folder", self.add_folder),
+            ("Remove", self.remove_selected),
+            ("Pull All", lambda: self.run_all("pull")),
+            ("Fetch All", lambda: self.run_all("fetch")),
+            ("Status All", lambda: self.run_all("status")),
+            ("Push All", self.push_all)
+        ]
+        for text, command in buttons:
+            ttk.Button(toolbar,
+                       text=text,
+                       style="Accent.TButton",
+                       command=command).pack(side=tk.LEFT, padx=2)
+
+        columns = ("repo", "changes", "operation", "state", "duration", "bytes", "result")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings")
+        for column, width in zip(columns, (220, 90, 80, 80, 80, 80, 260)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column in ("repo", "result"))
+        self.tree.tag_configure("failed", foreground="#ed4245")
+        self.tree.tag_configure("done", foreground="#3ba55d")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window, text="", style="TLabel", padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+
+        for repo in app.settings["workspace"]:
+            self.add_row(repo)
+        self.check_changes(list(self.rows))
+
+    def add_row(self, repo):
+        if repo not in self.rows:
+            self.rows[repo] = self.tree.insert("", tk.END, values=(repo, "", "", "", "", "", ""))
+
+    def check_changes(self, repos):
+        # Reads each index in-process, no git call per repository
+        locator = self.app.repo_locator
+
+        def worker():
+            for repo in repos:
+                try:
+                    info = locator.locate(repo)
+                    reasons = None if info is None else [reason for _, reason in changed_files(info)]
+                except (ValueError, OSError):
+                    reasons = None
+                if reasons is None:
+                    text = "?"
+                else:
+                    count = sum(1 for reason in reasons if reason != "unknown")
+                    unknown = len(reasons) - count
+                    text = f"{count} changed" if count else "clean"
+                    if unknown:
+                        # Files git would convert on checkin can't be compared here
+                        text = f"{count} changed, {unknown} ?" if count else f"{unknown} unverified"
+                self.app.call_in_ui(self.show_changes, repo, text)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_changes(self, repo, text):
+        item = self.rows.get(repo)
+        if item is None or not self.window.winfo_exists():
+            return
+        self.changes[repo] = text
+        self.tree.set(item, "changes", text)
+
+    def add_repo(self):
+        directory = filedialog.askdirectory(parent=self.window)
+        if directory:
+            self.add_repos([directory])
+
+    def add_folder(self):
+        # Picks up every direct subdirectory that is a git checkout
+        directory = filedialog.askdirectory(parent=self.window)
+        if not directory:
+            return
+        repos = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                 if os.path.exists(os.path.join(directory, name, ".git"))]
+        self.add_repos(repos)
+
+    def add_repos(self, repos):
+        workspace = self.app.settings["workspace"]
+        for repo in repos:
+            repo = os.path.normpath(repo)
+            if repo not in workspace:
+                workspace.append(repo)
+            self.add_row(repo)
+        self.check_changes([os.path.normpath(repo) for repo in repos])
+        self.app.update_fetcher()
+
+    def remove_selected(self):
+        for item in self.tree.selection():
+            repo = self.tree.item(item, "values")[0]
+            self.tree.delete(item)
+            del self.rows[repo]
+            self.app.settings["workspace"].remove(repo)
+        self.app.update_fetcher()
+
+    def busy(self):
+        if any(job.state in ("queued", "running") for job in self.batch):
+            messagebox.showerror("Error", "A workspace operation is still running", parent=self.window)
+            return True
+        return False
+
+    def run_all(self, operation):
+        if self.busy():
+            return
+        self.batch = []
+        self.batch_started = time.time()
+        for repo in self.app.settings["workspace"]:
+            if operation == "pull":
+                # Each repository pulls its checked out branch with the configured strategy
+                pipeline = pull_pipeline(repo, strategy=self.app.vars["pull_strategy"].get())
+            else:
+                pipeline = Pipeline.single(bulk_command(repo, operation))
+            job = Job(operation, pipeline, repo=repo,
+                      timeout=self.app.settings["job_timeout"] or None,
+                      env=dict(self.app.auth_env(), GIT_TERMINAL_PROMPT="0"))
+            self.batch.append(job)
+            self.app.bulk_scheduler.submit(job)
+        self.update_summary()
+
+    def push_all(self):
+        # One git push per repository for all its branches that are ahead
+        if self.busy():
+            return
+        repos = list(self.app.settings["workspace"])
+        branches = list(self.app.settings["dashboard_branches"])
+        self.summary.config(text="Looking for branches ahead of their upstream...")
+
+        def worker():
+            statuses = self.app.divergence.scan(repos, branches)
+            self.app.call_in_ui(self.submit_pushes, repos, statuses)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def submit_pushes(self, repos, statuses):
+        if not self.window.winfo_exists():
+            return
+        self.batch = []
+        self.batch_started = time.time()
+        for repo in repos:
+            branches = pending_branches(status for status in statuses if status.repo == repo)
+            if not branches:
+                continue
+            info = self.app.repo_locator.locate(repo)
+            if info is None:
+                continue
+            targets = push_targets(RefReader(info).upstream_refs(), branches)
+            job = Job("push", push_pipeline(repo, targets), repo=repo,
+                      timeout=self.app.settings["job_timeout"] or None,
+                      env=dict(self.app.auth_env(), GIT_TERMINAL_PROMPT="0"), capture=True)
+            self.batch.append(job)
+            self.app.bulk_scheduler.submit(job)
+        if not self.batch:
+            self.summary.config(text="Nothing to push, no branch is ahead of its upstream")
+            return
+        self.update_summary()
+
+    def update_job(self, job):
+        item = self.rows.get(job.repo)
+        if item is None or job not in self.batch:
+            return
+        result = job.error or job.last_line
+        if job.captured is not None and job.state in ("done", "failed"):
+            counts = count_states(job_push_results(job))
+            if counts:
+                result = ", ".join(f"{count} {state}" for state, count in counts.items())
+        self.tree.item(item,
+                       values=(job.repo, self.changes.get(job.repo, ""), job.name, job.state,
+                               f"{job.elapsed:.2f}s", format_bytes(job.transferred or job.output_bytes), result),
+                       tags=(job.state,))
+        if job.state in ("done", "failed", "cancelled"):
+            self.check_changes([job.repo])
+        self.update_summary()
+
+    def update_summary(self):
+        finished = [job for job in self.batch if job.state in ("done", "failed", "cancelled")]
+        failed = [job for job in finished if job.state != "done"]
+        text = f"{len(finished)}/{len(self.batch)} repositories finished, {len(failed)} failed"
+        results = [result for job in finished if job.captured is not None for result in job_push_results(job)]
+        if results:
+            text += " (refs: " + ", ".join(f"{count} {state}" for state, count in count_states(results).items()) + ")"
+        if self.batch and len(finished) == len(self.batch):
+            text += f" in {time.time() - self.batch_started:.1f}s"
+        self.summary.config(text=text)
+
+class MetricsWindow:
+    PERIODS = {"All": None, "Last 7 days": 7, "Last 30 days": 30}
+
+    def __init__(self, app):
+        self.app = app
+
+        self.window = Toplevel(app.root)
+        self.window.title("Metrics")
+        self.window.geometry("900x500")
+        self.window.configure(bg=app.colors["background"])
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(toolbar, text="Group by:", style="TLabel").pack(side=tk.LEFT)
+        self.group_by = tk.StringVar(value="repo")
+        group_by = ttk.Combobox(toolbar, textvariable=self.group_by, values=("repo", "remote"),
+                                state="readonly", width=10)
+        group_by.pack(side=tk.LEFT, padx=5)
+        group_by.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        self.period = tk.StringVar(value="All")
+        period = ttk.Combobox(toolbar, textvariable=self.period, values=list(self.PERIODS),
+                              state="readonly", width=14)
+        period.pack(side=tk.LEFT, padx=5)
+        period.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        ttk.Button(toolbar,
+                   text="Refresh",
+                   style="Accent.TButton",
+                   command=self.refresh).pack(side=tk.RIGHT, padx=2)
+
+        columns = ("operation", "name", "runs", "failed", "p50", "p95", "max", "transferred", "last run")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings")
+        for column, width in zip(columns, (100, 260, 50, 50, 70, 70, 70, 90, 130)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column == "name")
+        self.tree.tag_configure("failed", foreground="#ed4245")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window, text="", style="TLabel", padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+        self.refresh()
+
+    def refresh(self):
+        by = self.group_by.get()
+        days = self.PERIODS[self.period.get()]
+        since = time.time() - days * 86400 if days else None
+        self.summary.config(text="Loading metrics...")
+
+        def worker():
+            rows = self.app.metrics.summary(by, since)
+            self.app.call_in_ui(self.show_rows, by, rows)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_rows(self, by, rows):
+        if not self.window.winfo_exists():
+            return
+
+        def seconds(value):
+            return "" if value is None else f"{value:.2f}s"
+
+        self.tree.heading("name", text=by.capitalize())
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert("", tk.END,
+                             values=(row["operation"], row[by], row["runs"], row["failed"],
+                                     seconds(row["p50"]), seconds(row["p95"]), seconds(row["max"]),
+                                     format_bytes(row["transferred"]),
+                                     time.strftime("%Y-%m-%d %H:%M", time.localtime(row["last"]))),
+                             tags=("failed",) if row["failed"] else ())
+        runs = sum(row["runs"] for row in rows)
+        self.summary.config(text=f"{runs} jobs recorded in {self.app.metrics.path}, slowest p95 first")
+
+class WorktreeWindow:
+    def __init__(self, app):
+        self.app = app
+        self.worktrees = {}
+        self.jobs = {}
+
+        self.window = Toplevel(app.root)
+        self.window.title("Worktrees")
+        self.window.geometry("900x450")
+        self.window.configure(bg=app.colors["background"])
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(toolbar, text="Branch:", style="TLabel").pack(side=tk.LEFT)
+        self.branch = tk.StringVar(value=app.vars["branch"].get())
+        ttk.Combobox(toolbar,
+                     textvariable=self.branch,
+                     values=app.branch_box.cget("values"),
+                     width=30).pack(side=tk.LEFT, padx=5)
+        buttons = [
+            ("Add Worktree", self.add_worktree),
+            ("Open", self.open_selected),
+            ("Remove", self.remove_selected),
+            ("Prune", self.prune),
+            ("Refresh", self.refresh)
+        ]
+        for text, command in buttons:
+            ttk.Button(toolbar,
+                       text=text,
+                       style="Accent.TButton",
+                       command=command).pack(side=tk.LEFT, padx=2)
+
+        columns = ("path", "branch", "head", "state")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings", selectmode="browse")
+        for column, width in zip(columns, (420, 180, 100, 90)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column == "path")
+        self.tree.tag_configure("current", foreground="#3ba55d")
+        self.tree.tag_configure("prunable", foreground="#ed4245")
+        self.tree.bind("<Double-1>", lambda e: self.open_selected())
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window, text="", style="TLabel", padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+        self.refresh()
+
+    def repository(self):
+        directory = self.app.vars["local_dir"].get()
+        info = self.app.repo_locator.locate(directory) if directory else None
+        if info is None:
+            messagebox.showerror("Error", "Local Directory is not a Git repository", parent=self.window)
+        return info
+
+    def refresh(self):
+        info = self.repository()
+        if info is None:
+            return
+        self.summary.config(text="Loading worktrees...")
+
+        def worker():
+            try:
+                worktrees = list_worktrees(info.worktree)
+                self.app.call_in_ui(self.show_worktrees, worktrees)
+            except (ValueError, OSError) as e:
+                self.app.call_in_ui(self.show_error, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_error(self, message):
+        if self.window.winfo_exists():
+            self.summary.config(text=message)
+
+    def show_worktrees(self, worktrees):
+        if not self.window.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        self.worktrees = {}
+        current = os.path.normcase(os.path.normpath(self.app.vars["local_dir"].get()))
+        for worktree in worktrees:
+            tags = ("current",) if os.path.normcase(worktree.path) == current else (worktree.state,)
+            item = self.tree.insert("", tk.END,
+                                    values=(worktree.path, worktree.branch or "", (worktree.head or "")[:10],
+                                            worktree.state),
+                                    tags=tags)
+            self.worktrees[item] = worktree
+        self.summary.config(text=f"{len(worktrees)} worktrees sharing one object store")
+
+    def selected(self):
+        selection = self.tree.selection()
+        return self.worktrees.get(selection[0]) if selection else None
+
+    def main_worktree(self):
+        return next(iter(self.worktrees.values()), None)
+
+    def submit(self, name, command, repo, worktree=None):
+        job = Job(name, Pipeline.single(command, name), repo=repo,
+                  timeout=self.app.settings["job_timeout"] or None,
+                  env=dict(self.app.auth_env(), GIT_TERMINAL_PROMPT="0"))
+        self.jobs[job] = worktree
+        self.summary.config(text=f"{name}: {repo}")
+        self.app.bulk_scheduler.submit(job)
+        return job
+
+    def add_worktree(self):
+        info = self.repository()
+        branch = self.branch.get().strip()
+        if info is None or not branch:
+            return
+        refs = self.app.ref_cache.get(info)
+        for item, worktree in self.worktrees.items():
+            if worktree.branch == local_branch(branch, refs):
+                # Already checked out somewhere, git would refuse a second worktree
+                self.tree.selection_set(item)
+                self.open_selected()
+                return
+        main_worktree = self.main_worktree()
+        path = worktree_path(main_worktree.path if main_worktree else info.worktree, local_branch(branch, refs))
+        if os.path.exists(path):
+            messagebox.showerror("Error", f"{path} already exists", parent=self.window)
+            return
+        self.submit("worktree add", add_worktree_command(info.worktree, path, branch, refs), path)
+
+    def open_selected(self):
+        # Switching branches becomes switching directories, nothing is checked out again
+        worktree = self.selected()
+        if worktree is None or worktree.bare or worktree.prunable is not None:
+            return
+        self.app.vars["local_dir"].set(worktree.path)
+        if worktree.branch:
+            self.app.vars["branch"].set(worktree.branch)
+        self.app.status.config(text=f"Switched to worktree {worktree.path}")
+        self.refresh()
+
+    def remove_selected(self, force=False):
+        worktree = self.selected()
+        if worktree is None:
+            return
+        main_worktree = self.main_worktree()
+        if worktree is main_worktree:
+            messagebox.showerror("Error", "The main worktree cannot be removed", parent=self.window)
+            return
+        if not force and not messagebox.askyesno("Remove Worktree", f"Remove {worktree.path}?",
+                                                 parent=self.window):
+            return
+        self.submit("worktree remove", remove_worktree_command(main_worktree.path, worktree.path, force),
+                    worktree.path, worktree)
+
+    def prune(self):
+        info = self.repository()
+        if info is not None:
+            self.submit("worktree prune", prune_worktrees_command(info.worktree), info.worktree)
+
+    def update_job(self, job):
+        if job not in self.jobs or job.state not in ("done", "failed", "cancelled"):
+            return
+        removed = self.jobs.pop(job)
+        if job.state == "failed" and job.name == "worktree remove" and "--force" in job.last_line:
+            if messagebox.askyesno("Remove Worktree",
+                                   f"{job.repo} has local changes. Remove it anyway and discard them?",
+                                   parent=self.window):
+                self.tree.selection_set([item for item, worktree in self.worktrees.items()
+                                         if worktree is removed])
+                self.remove_selected(force=True)
+        elif job.state == "failed":
+            messagebox.showerror("Error", job.error or job.last_line, parent=self.window)
+        self.refresh()
+
+class DashboardWindow:
+    STATES = ("push", "pull", "diverged", "error", "upstream gone")
+
+    def __init__(self, app):
+        self.app = app
+        self.statuses = []
+        self.scanning = False
+
+        self.window = Toplevel(app.root)
+        self.window.title("Dashboard")
+        self.window.geometry("900x500")
+        self.window.configure(bg=app.colors["background"])
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(toolbar, text="Branches:", style="TLabel").pack(side=tk.LEFT)
+        self.branches = tk.StringVar(value=", ".join(app.settings["dashboard_branches"]))
+        ttk.Entry(toolbar, textvariable=self.branches, width=30).pack(side=tk.LEFT, padx=5)
+        self.pending_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar,
+                        text="Only needs push/pull",
+                        variable=self.pending_only,
+                        command=self.show_rows).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar,
+                   text="Refresh",
+                   style="Accent.TButton",
+                   command=self.refresh).pack(side=tk.RIGHT, padx=2)
+
+        columns = ("repo", "branch", "upstream", "ahead", "behind", "state")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings")
+        for column, width in zip(columns, (300, 140, 160, 60, 60, 100)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column == "repo")
+        self.tree.tag_configure("push", foreground="#5865f2")
+        self.tree.tag_configure("pull", foreground="#faa61a")
+        self.tree.tag_configure("diverged", foreground="#ed4245")
+        self.tree.tag_configure("error", foreground="#ed4245")
+        self.tree.tag_configure("upstream gone", foreground="#ed4245")
+        self.tree.tag_configure("up to date", foreground="#3ba55d")
+        self.tree.bind("<Double-1>", lambda e: self.open_selected())
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window, text="", style="TLabel", padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+        self.refresh()
+
+    def repos(self):
+        repos = list(self.app.settings["workspace"])
+        current = self.app.vars["local_dir"].get()
+        if current and os.path.normpath(current) not in repos:
+            repos.insert(0, os.path.normpath(current))
+        return repos
+
+    def refresh(self):
+        if self.scanning:
+            return
+        branches = [name.strip() for name in self.branches.get().split(",") if name.strip()]
+        self.app.settings["dashboard_branches"] = branches
+        repos = self.repos()
+        self.scanning = True
+        self.summary.config(text=f"Checking {len(repos)} repositories...")
+
+        def worker():
+            started = time.perf_counter()
+            try:
+                statuses = self.app.divergence.scan(repos, branches)
+            except Exception as e:
+                self.app.call_in_ui(self.scan_failed, str(e) or type(e).__name__)
+                return
+            finally:
+                self.app.call_in_ui(self.scan_finished)
+            self.app.call_in_ui(self.show_statuses, statuses, time.perf_counter() - started)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def scan_finished(self):
+        self.scanning = False
+
+    def scan_failed(self, message):
+        if self.window.winfo_exists():
+            self.summary.config(text=f"Checking failed: {message}")
+
+    def show_statuses(self, statuses, elapsed):
+        if not self.window.winfo_exists():
+            return
+        self.statuses = statuses
+        self.show_rows()
+        counted = [status for status in statuses if status.ahead is not None]
+        computed = [status for status in counted if not status.cached]
+        pending = [status for status in statuses if status.state in self.STATES]
+        self.summary.config(text=f"{len(pending)} of {len(statuses)} branches need attention, "
+                                 f"{len(computed)} counted and {len(counted) - len(computed)} unchanged "
+                                 f"in {elapsed:.2f}s")
+
+    def show_rows(self):
+        self.tree.delete(*self.tree.get_children())
+        for status in self.statuses:
+            if self.pending_only.get() and status.state not in self.STATES:
+                continue
+            self.tree.insert("", tk.END,
+                             values=(status.repo, status.branch, status.upstream or "",
+                                     "" if status.ahead is None else status.ahead,
+                                     "" if status.behind is None else status.behind,
+                                     status.error or status.state),
+                             tags=(status.state,))
+
+    def open_selected(self):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        repo, branch = self.tree.item(selection[0], "values")[:2]
+        self.app.vars["local_dir"].set(repo)
+        if branch:
+            self.app.vars["branch"].set(branch)
+
+class PushWindow:
+    def __init__(self, app):
+        self.app = app
+        self.rows = {}
+        self.jobs = []
+        self.directory = None
+
+        self.window = Toplevel(app.root)
+        self.window.title("Push Branches and Tags")
+        self.window.geometry("800x450")
+        self.window.configure(bg=app.colors["background"])
+
+        toolbar = ttk.Frame(self.window, style="Background.TFrame")
+        toolbar.pack(fill=tk.X, padx=10, pady=10)
+        buttons = [
+            ("Push Selected", self.push_selected),
+            ("Select Pending", self.select_pending),
+            ("Refresh", self.refresh)
+        ]
+        for text, command in buttons:
+            ttk.Button(toolbar,
+                       text=text,
+                       style="Accent.TButton",
+                       command=command).pack(side=tk.LEFT, padx=2)
+        self.atomic = tk.BooleanVar(value=False)
+        atomic = ttk.Checkbutton(toolbar, text="Atomic", variable=self.atomic)
+        atomic.pack(side=tk.LEFT, padx=10)
+        Tooltip(atomic, "The remote accepts all selected refs or none of them")
+
+        columns = ("ref", "kind", "upstream", "ahead", "behind", "result")
+        self.tree = ttk.Treeview(self.window, columns=columns, show="headings")
+        for column, width in zip(columns, (220, 60, 160, 60, 60, 200)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, stretch=column in ("ref", "result"))
+        self.tree.tag_configure("push", foreground="#5865f2")
+        self.tree.tag_configure("diverged", foreground="#ed4245")
+        self.tree.tag_configure("failed", foreground="#ed4245")
+        self.tree.tag_configure("done", foreground="#3ba55d")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        self.summary = ttk.Label(self.window, text="", style="TLabel", padding=10)
+        self.summary.pack(fill=tk.X, padx=10)
+        self.refresh()
+
+    def repository(self):
+        directory = self.app.vars["local_dir"].get()
+        info = self.app.repo_locator.locate(directory) if directory else None
+        if info is None:
+            messagebox.showerror("Error", "Local Directory is not a Git repository", parent=self.window)
+        return info
+
+    def refresh(self):
+        info = self.repository()
+        if info is None:
+            return
+        directory = self.app.vars["local_dir"].get()
+        self.summary.config(text="Reading branches and tags...")
+
+        def worker():
+            refs = self.app.ref_cache.get(info)
+            statuses = self.app.divergence.scan([directory], refs.local)
+            self.app.call_in_ui(self.show_refs, directory, refs, statuses)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_refs(self, directory, refs, statuses):
+        if not self.window.winfo_exists():
+            return
+        self.directory = directory
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+        for status in statuses:
+            if status.branch:
+                self.rows[f"refs/heads/{status.branch}"] = self.tree.insert(
+                    "", tk.END,
+                    values=(status.branch, "branch", status.upstream or "",
+                            "" if status.ahead is None else status.ahead,
+                            "" if status.behind is None else status.behind, status.state),
+                    tags=(status.state,))
+        for tag in refs.tags:
+            self.rows[f"refs/tags/{tag}"] = self.tree.insert("", tk.END, values=(tag, "tag", "", "", "", ""))
+        self.select_pending()
+
+    def select_pending(self):
+        self.tree.selection_set([item for item in self.rows.values() if "push" in self.tree.item(item, "tags")])
+        self.summary.config(text=f"{len(self.tree.selection())} of {len(self.rows)} refs selected")
+
+    def push_selected(self):
+        # All selected refs go through one git push per remote
+        names = [name for name, item in self.rows.items() if item in self.tree.selection()]
+        if not names or self.directory is None:
+            return
+        if any(job.state in ("queued", "running") for job in self.jobs):
+            messagebox.showerror("Error", "A push is still running", parent=self.window)
+            return
+        info = self.app.repo_locator.locate(self.directory)
+        if info is None:
+            return
+        branches = [name[len("refs/heads/"):] for name in names if name.startswith("refs/heads/")]
+        tags = [name[len("refs/tags/"):] for name in names if name.startswith("refs/tags/")]
+        targets = push_targets(RefReader(info).upstream_refs(), branches, tags)
+        job = Job("push", push_pipeline(self.directory, targets, self.atomic.get()), repo=self.directory,
+                  timeout=self.app.settings["job_timeout"] or None,
+                  env=dict(self.app.auth_env(), GIT_TERMINAL_PROMPT="0"), capture=True)
+        self.jobs.append(job)
+        for name in names:
+            self.tree.set(self.rows[name], "result", "queued")
+        self.summary.config(text=f"Pushing {len(names)} refs...")
+        self.app.bulk_scheduler.submit(job)
+
+    def update_job(self, job):
+        if job not in self.jobs or job.state not in ("done", "failed", "cancelled"):
+            return
+        self.jobs.remove(job)
+        results = job_push_results(job)
+        for result in results:
+            # Rows are keyed by the local ref, the remote name may differ
+            item = self.rows.get(result.source)
+            if item is not None:
+                text = result.state + (f": {result.reason}" if result.reason else "")
+                self.tree.set(item, "result", text)
+                self.tree.item(item, tags=("failed",) if result.flag == "!" else ("done",))
+        if results:
+            self.summary.config(text=", ".join(f"{count} {state}" for state, count in count_states(results).items()))
+        else:
+            self.summary.config(text=job.error or job.last_line or job.state)
+
 class DiscordStyleGitLabUI:
-    def __init__(self, root):
+    def __init__(self, root, profile=None):
         self.root = root
+        self.profile = profile or StartupProfile()
         self.root.title("GitLab Manager v0.2.1")
         if platform.system() == "Windows":
             try:
@@ -71,9 +1022,34 @@ class DiscordStyleGitLabUI:
         }
 
         self.setup_style()
+        self.profile.mark("style")
         self.selected_files = []
+        self.changes = PathStore()
+        self.changes_root = None
+        self.status_scan = None
+        self.rescan_pending = False
+        self.rescan_paths = None
+        self.pull_waiting = False
         self.token_visible = False
         self.nav_buttons = []
+        self.ui_queue = queue.Queue()
+        self.settings = {}
+        self.job_rows = {}
+        self.repo_locator = RepoLocator()
+        self.ref_cache = RefCache()
+        self.branch_refs = None
+        self.ahead_behind = None
+        self.divergence = AheadBehind()
+        self.watcher = None
+        self.watch_pending = None
+        self.workspace_window = None
+        self.group_window = None
+        self.metrics_window = None
+        self.worktree_window = None
+        self.dashboard_window = None
+        self.push_window = None
+        self.fetcher = None
+        self.client = None
 
         # Haupt-Frames
         self.main_frame = ttk.Frame(self.root, style="Secondary.TFrame")
@@ -88,10 +1064,71 @@ class DiscordStyleGitLabUI:
         self.content_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 
         self.create_widgets()
+        self.profile.mark("widgets")
         self.create_sidebar()
+        self.profile.mark("sidebar")
         self.create_file_list()
+        self.create_job_panel()
+        self.profile.mark("file list, job panel")
         self.load_config()
+        self.refresh_branches(select_current=False)
+        self.profile.mark("config, branches")
+        self.vars["local_dir"].trace_add("write", lambda *args: self.local_dir_changed())
+        self.metrics = MetricsStore(self.settings["metrics_file"])
+        self.object_cache = ObjectCache(self.settings["object_cache_dir"] or None,
+                                        self.settings["object_cache_size"] * 1024 ** 3,
+                                        self.settings["object_cache_dissociate"])
+        self.cache_var.set(self.settings["object_cache"])
+        self.scheduler = JobScheduler(self.settings["max_jobs"],
+                                      on_output=self.job_output,
+                                      on_change=lambda job: self.call_in_ui(self.update_job_row, job),
+                                      on_progress=self.job_progress,
+                                      metrics=self.metrics)
+        self.bulk_scheduler = JobScheduler(self.settings["bulk_jobs"],
+                                           on_change=lambda job: self.call_in_ui(self.update_bulk_job, job),
+                                           metrics=self.metrics)
+        self.trace_var.set(self.settings["trace_git"])
+        self.toggle_trace()
+        self.fetch_var.set(self.settings["background_fetch"])
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(50, self.process_ui_queue)
+        # The idle callback runs once the first frame is drawn, the logo and the
+        # repository watcher are not needed for that
+        self.root.after_idle(lambda: self.root.after(0, self.first_frame_shown))
+
+    def first_frame_shown(self):
+        self.profile.mark("first frame")
+        self.load_logo()
+        self.profile.mark("logo")
+        self.toggle_fetch()
+        self.watch_repository()
+        self.profile.mark("repository watcher")
+        self.profile.report()
+
+    def load_logo(self):
+        # Pre-scaled PNG that Tk can read natively, Pillow is only imported to
+        # render it again when the shipped copy is missing
+        cached = user_cache_dir("logo_80.png")
+        for path in (resource_path(self, "logo_80.png"), cached):
+            if os.path.exists(path):
+                try:
+                    photo = tk.PhotoImage(file=path)
+                    break
+                except tk.TclError:
+                    pass
+        else:
+            try:
+                from PIL import Image
+                logo_image = Image.open(resource_path(self, "logo.ico"))
+                logo_image = logo_image.resize((80, 80), Image.LANCZOS)
+                os.makedirs(os.path.dirname(cached), exist_ok=True)
+                logo_image.save(cached)
+                photo = tk.PhotoImage(file=cached)
+            except Exception as e:
+                print(f"Failed to load logo: {e}")
+                return
+        self.logo_photo = photo
+        self.logo_label.config(image=photo)
 
     def setup_style(self):
         style = ttk.Style()
@@ -121,39 +1158,42 @@ class DiscordStyleGitLabUI:
         style.map("Accent.TButton",
                   background=[("active", "#4752c4"), ("pressed", "#3c45a5")])
 
+        style.configure("Treeview",
+                        background=self.colors["input_bg"],
+                        fieldbackground=self.colors["input_bg"],
+                        foreground=self.colors["text"],
+                        borderwidth=0)
+        style.configure("Treeview.Heading",
+                        background=self.colors["secondary"],
+                        foreground=self.colors["text"])
+        style.map("Treeview", background=[("selected", self.colors["accent"])])
+
     def create_sidebar(self):
         logo_frame = ttk.Frame(self.sidebar, style="Secondary.TFrame")
         logo_frame.pack(pady=20)
 
-        # Load and display logo
-        try:
-            if platform.system() == "Windows":
-                logo_path = resource_path(self, "logo.ico")
-            else:
-                logo_path = "logo.ico"
-            logo_image = Image.open(logo_path)
-            logo_image = logo_image.resize((80, 80), Image.LANCZOS)
-            logo_photo = ImageTk.PhotoImage(logo_image)
-            self.logo_photo = logo_photo
-
-            logo_label = ttk.Label(logo_frame, image=logo_photo, style="Secondary.TLabel")
-            logo_label.pack(pady=5)
-            ttk.Label(logo_frame,
-                      text="GitLab Manager",
-                      style="TLabel",
-                      font=("Helvetica", 14, "bold")).pack(pady=5)
-        except Exception as e:
-            print(f"Failed to load logo: {e}")
-            ttk.Label(logo_frame,
-                      text="GitLab Manager",
-                      style="TLabel",
-                      font=("Helvetica", 14, "bold")).pack(pady=10)
+        # Blank placeholder of the logo's size, load_logo fills it after the first frame
+        self.logo_photo = tk.PhotoImage(width=80, height=80)
+        self.logo_label = ttk.Label(logo_frame, image=self.logo_photo, style="Secondary.TLabel")
+        self.logo_label.pack(pady=5)
+        ttk.Label(logo_frame,
+                  text="GitLab Manager",
+                  style="TLabel",
+                  font=("Helvetica", 14, "bold")).pack(pady=5)
 
         nav_buttons = [
             ("Clone Repo", self.clone_repo),
+            ("Upgrade Clone", self.upgrade_clone),
             ("Commit", self.commit),
+            ("Commit & Push", self.commit_and_push),
             ("Push", self.push),
-            ("Pull", self.pull)
+            ("Push Refs", self.open_push),
+            ("Pull", self.pull),
+            ("Workspace", self.open_workspace),
+            ("Dashboard", self.open_dashboard),
+            ("Worktrees", self.open_worktrees),
+            ("Clone Group", self.open_group_clone),
+            ("Metrics", self.open_metrics)
         ]
 
         for text, command in nav_buttons:
@@ -180,7 +1220,11 @@ class DiscordStyleGitLabUI:
             "token": tk.StringVar(),
             "local_dir": tk.StringVar(),
             "commit_message": tk.StringVar(),
-            "branch": tk.StringVar(value="main")
+            "branch": tk.StringVar(value="main"),
+            "clone_strategy": tk.StringVar(value="full"),
+            "clone_depth": tk.StringVar(value="1"),
+            "sparse_paths": tk.StringVar(),
+            "pull_strategy": tk.StringVar(value="ff-only")
         }
 
         for i, (label, var_name) in enumerate(input_fields):
@@ -192,7 +1236,23 @@ class DiscordStyleGitLabUI:
                       style="TLabel",
                       width=15).pack(side=tk.LEFT)
 
-            if var_name == "local_dir":
+            if var_name == "branch":
+                self.branch_box = ttk.Combobox(frame,
+                                               textvariable=self.vars[var_name],
+                                               postcommand=self.refresh_branches,
+                                               width=30)
+                self.branch_box.pack(side=tk.LEFT)
+                self.branch_box.bind("<<ComboboxSelected>>", self.branch_selected)
+                pull = ttk.Combobox(frame,
+                                    textvariable=self.vars["pull_strategy"],
+                                    values=list(PULL_STRATEGIES),
+                                    state="readonly",
+                                    width=10)
+                pull.pack(side=tk.LEFT, padx=(10, 0))
+                Tooltip(pull, "How Pull brings in origin/<branch>")
+                self.branch_info = ttk.Label(frame, text="", style="TLabel")
+                self.branch_info.pack(side=tk.LEFT, padx=10)
+            elif var_name == "local_dir":
                 entry = ttk.Entry(frame,
                                   textvariable=self.vars[var_name],
                                   style="TEntry",
@@ -216,6 +1276,32 @@ class DiscordStyleGitLabUI:
                     Tooltip(entry, "GitLab Personal Access Token")
                 entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        # Clone Optionen
+        frame = ttk.Frame(self.content_frame, style="Background.TFrame")
+        frame.pack(fill=tk.X, padx=20, pady=10)
+        ttk.Label(frame, text="Clone Mode:", style="TLabel", width=15).pack(side=tk.LEFT)
+        ttk.Combobox(frame,
+                     textvariable=self.vars["clone_strategy"],
+                     values=list(CLONE_STRATEGIES),
+                     state="readonly",
+                     width=14).pack(side=tk.LEFT)
+        ttk.Label(frame, text="Depth:", style="TLabel").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Entry(frame, textvariable=self.vars["clone_depth"], style="TEntry", width=5).pack(side=tk.LEFT)
+        ttk.Label(frame, text="Sparse Paths:", style="TLabel").pack(side=tk.LEFT, padx=(10, 2))
+        sparse_entry = ttk.Entry(frame, textvariable=self.vars["sparse_paths"], style="TEntry")
+        sparse_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        Tooltip(sparse_entry, "Space separated directories for sparse mode")
+        self.cache_var = tk.BooleanVar(value=False)
+        cache = ttk.Checkbutton(frame,
+                                text="Object Cache",
+                                variable=self.cache_var,
+                                command=lambda: self.settings.update(object_cache=self.cache_var.get()))
+        cache.pack(side=tk.LEFT, padx=(10, 0))
+        Tooltip(cache, "Keep a local mirror per remote, later clones only download new objects. "
+                       "Only for full and single-branch clones, a mirror holds the whole history")
+        self.cache_check = cache
+        self.vars["clone_strategy"].trace_add("write", lambda *args: self.clone_strategy_changed())
+
         # Console Ausgabe
         self.console = tk.Text(self.content_frame,
                                bg=self.colors["input_bg"],
@@ -226,6 +1312,7 @@ class DiscordStyleGitLabUI:
         scrollbar = ttk.Scrollbar(self.content_frame, command=self.console.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.console.config(yscrollcommand=scrollbar.set)
+        self.console_sink = ConsoleSink(self.root, self.console)
 
         # Statusleiste
         self.status = ttk.Label(self.content_frame,
@@ -235,21 +1322,222 @@ class DiscordStyleGitLabUI:
                                 padding=10)
         self.status.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=10)
 
+        self.progress = ttk.Progressbar(self.content_frame, mode="determinate", maximum=100)
+        self.progress.pack(side=tk.BOTTOM, fill=tk.X, padx=20)
+        self.progress_job = None
+
     def create_file_list(self):
         file_frame = ttk.Frame(self.content_frame, style="Background.TFrame")
         file_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
 
-        ttk.Button(file_frame,
+        buttons = ttk.Frame(file_frame, style="Background.TFrame")
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons,
                    text="Select Files",
                    style="Accent.TButton",
-                   command=self.select_files).pack(anchor=tk.W, pady=1)
+                   command=self.select_files).pack(side=tk.LEFT, pady=1)
+        ttk.Button(buttons,
+                   text="Refresh Changes",
+                   style="Accent.TButton",
+                   command=self.refresh_changes).pack(side=tk.LEFT, padx=5, pady=1)
+        self.changes_info = ttk.Label(buttons, text="", style="TLabel")
+        self.changes_info.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(buttons, text="Filter:", style="TLabel").pack(side=tk.LEFT, padx=(10, 2))
+        self.change_filter = tk.StringVar()
+        ttk.Entry(buttons, textvariable=self.change_filter, style="TEntry", width=20).pack(side=tk.LEFT)
+        self.change_sort = tk.StringVar(value="path")
+        sort_box = ttk.Combobox(buttons,
+                                textvariable=self.change_sort,
+                                values=PathStore.SORT_KEYS,
+                                state="readonly",
+                                width=7)
+        sort_box.pack(side=tk.LEFT, padx=5)
+        self.change_filter.trace_add("write", lambda *args: self.apply_change_view())
+        sort_box.bind("<<ComboboxSelected>>", lambda event: self.apply_change_view())
+
+        self.file_list = VirtualList(file_frame,
+                                     self.changes,
+                                     self.change_text,
+                                     bg=self.colors["input_bg"],
+                                     fg=self.colors["text"],
+                                     selectbackground=self.colors["accent"],
+                                     height=6)
+        self.file_list.pack(fill=tk.BOTH, expand=True)
+        self.file_list.bind_rows("<Double-Button-1>", self.toggle_change)
+        self.file_list.bind_rows("<space>", self.toggle_change)
+
+    def create_job_panel(self):
+        job_frame = ttk.Frame(self.content_frame, style="Background.TFrame")
+        job_frame.pack(fill=tk.X, padx=20, pady=10)
+
+        header = ttk.Frame(job_frame, style="Background.TFrame")
+        header.pack(fill=tk.X)
+        ttk.Label(header, text="Jobs:", style="TLabel").pack(side=tk.LEFT)
+        ttk.Button(header,
+                   text="Cancel Job",
+                   style="Accent.TButton",
+                   command=self.cancel_selected_jobs).pack(side=tk.RIGHT, pady=1)
+        self.trace_var = tk.BooleanVar(value=False)
+        trace = ttk.Checkbutton(header, text="Trace git", variable=self.trace_var, command=self.toggle_trace)
+        trace.pack(side=tk.RIGHT, padx=10)
+        Tooltip(trace, "Run git with GIT_TRACE2_EVENT and print where the time went after each job")
+        self.fetch_var = tk.BooleanVar(value=False)
+        fetch = ttk.Checkbutton(header, text="Auto fetch", variable=self.fetch_var, command=self.toggle_fetch)
+        fetch.pack(side=tk.RIGHT, padx=10)
+        Tooltip(fetch, "Fetch the current and the workspace repositories in the background, "
+                       "so pulling only has to merge locally")
+
+        columns = ("operation", "state", "time")
+        self.job_tree = ttk.Treeview(job_frame, columns=columns, show="headings", height=4)
+        self.job_tree.heading("operation", text="Operation")
+        self.job_tree.heading("state", text="State")
+        self.job_tree.heading("time", text="Time")
+        self.job_tree.column("state", width=90, stretch=False)
+        self.job_tree.column("time", width=70, stretch=False, anchor=tk.E)
+        self.job_tree.pack(fill=tk.X)
+
+    def toggle_trace(self):
+        self.settings["trace_git"] = self.trace_var.get()
+        trace_dir = default_trace_dir() if self.settings["trace_git"] else None
+        self.scheduler.trace_dir = trace_dir
+        self.bulk_scheduler.trace_dir = trace_dir
+
+    def toggle_fetch(self):
+        self.settings["background_fetch"] = self.fetch_var.get()
+        if self.settings["background_fetch"] and self.fetcher is None:
+            self.fetcher = BackgroundFetcher(interval=self.settings["fetch_interval"],
+                                             active_interval=self.settings["fetch_active_interval"],
+                                             max_jobs=self.settings["fetch_jobs"],
+                                             state_path=self.settings["fetch_state_file"] or None,
+                                             timeout=self.settings["job_timeout"] or 300,
+                                             metrics=self.metrics,
+                                             on_fetched=lambda job, state: self.call_in_ui(self.background_fetched,
+                                                                                           job, state))
+            self.update_fetcher()
+            self.fetcher.start()
+        elif not self.settings["background_fetch"] and self.fetcher is not None:
+            self.fetcher.stop()
+            self.fetcher = None
+
+    def update_fetcher(self):
+        # Called from the UI thread, the fetcher never reads the Tk variables itself
+        if self.fetcher is None:
+            return
+        directory = self.vars["local_dir"].get()
+        info = self.repo_locator.locate(directory) if directory else None
+        self.fetcher.env = self.auth_env()
+        self.fetcher.set_active(directory if info else None)
+        self.fetcher.set_repos(self.settings["workspace"] + ([directory] if info else []))
+
+    def background_fetched(self, job, state):
+        # Refreshed refs reach the branch info through the repository watcher,
+        # only the first failure of a repository is worth a console line
+        if job.state == "failed" and state.failures == 1:
+            self.console_sink.write(f"Background fetch of {job.repo} failed: {state.error}, "
+                                    f"retrying with backoff\n")
+
+    def update_job_row(self, job):
+        values = (f"#{job.id} {job.name}", job.state, f"{job.elapsed:.1f}s")
+        if job.id in self.job_rows:
+            self.job_tree.item(self.job_rows[job.id], values=values)
+        else:
+            self.job_rows[job.id] = self.job_tree.insert("", 0, values=values)
+        # Only keep the most recent jobs in the list
+        for item in self.job_tree.get_children()[50:]:
+            self.job_tree.delete(item)
+            self.job_rows = {k: v for k, v in self.job_rows.items() if v != item}
+
+        if job.state in ("done", "failed", "cancelled"):
+            self.trim_object_cache(job)
+            self.job_finished(job)
+
+    def cancel_selected_jobs(self):
+        ids = {item: job_id for job_id, item in self.job_rows.items()}
+        for item in self.job_tree.selection():
+            job = self.scheduler.jobs.get(ids.get(item))
+            if job:
+                self.scheduler.cancel(job)
+
+    def refresh_branches(self, select_current=True):
+        directory = self.vars["local_dir"].get()
+        info = self.repo_locator.locate(directory) if directory else None
+        if info is None:
+            self.branch_refs = None
+            self.branch_box.config(values=[])
+            self.show_branch_info()
+            return
+        refs = self.branch_refs = self.ref_cache.get(info)
+        # Remote branches without a local counterpart are offered as origin/<name>
+        remote_only = [name for name in refs.remote if name.split("/", 1)[-1] not in refs.local]
+        self.branch_box.config(values=refs.local + remote_only)
+        self.show_branch_info()
+        if select_current and refs.head_branch and self.vars["branch"].get() not in refs.local:
+            self.vars["branch"].set(refs.head_branch)
+
+    def show_branch_info(self):
+        refs = self.branch_refs
+        if refs is None:
+            self.branch_info.config(text="")
+            return
+        if refs.head_branch is None:
+            self.branch_info.config(text=f"detached at {(refs.head_commit or '')[:10]}")
+            return
+        upstream = refs.upstreams.get(refs.head_branch)
+        text = f"current: {refs.head_branch}"
+        if upstream:
+            text += f" -> {upstream}"
+            if self.ahead_behind:
+                text += f" (ahead {self.ahead_behind[0]}, behind {self.ahead_behind[1]})"
+        self.branch_info.config(text=text)
+
+    def refresh_ahead_behind(self):
+        directory = self.vars["local_dir"].get()
 
-        self.file_listbox = tk.Listbox(file_frame,
-                                       bg=self.colors["input_bg"],
-                                       fg=self.colors["text"],
-                                       selectbackground=self.colors["accent"],
-                                       height=6)
-        self.file_listbox.pack(fill=tk.BOTH, expand=True)
+        def worker():
+            # Shares the dashboard's counts, a ref change that left HEAD and
+            # its upstream alone needs no git call
+            try:
+                statuses = self.divergence.branches(directory)
+            except (ValueError, OSError):
+                return
+            status = self.divergence.fill(statuses[0]) if statuses else None
+            ahead_behind = (status.ahead, status.behind) if status and status.ahead is not None else None
+            self.call_in_ui(self.set_ahead_behind, ahead_behind)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def set_ahead_behind(self, ahead_behind):
+        self.ahead_behind = ahead_behind
+        self.show_branch_info()
+
+    def watch_repository(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        directory = self.vars["local_dir"].get()
+        info = self.repo_locator.locate(directory) if directory else None
+        self.ahead_behind = None
+        self.update_fetcher()
+        if info is not None:
+            self.watcher = RepoWatcher(info, lambda aspects, paths: self.call_in_ui(self.repository_changed,
+                                                                                    aspects, paths)).start()
+            self.refresh_changes()
+
+    def repository_changed(self, aspects, paths=None):
+        # Only the parts that are affected by the change get refreshed, a
+        # branch switch touches every file
+        if aspects & {"branch", "refs"}:
+            self.refresh_branches()
+        if "files" in aspects or "branch" in aspects:
+            self.refresh_changes(None if "branch" in aspects else paths)
+        elif "refs" in aspects:
+            self.refresh_ahead_behind()
+
+    def branch_selected(self, event=None):
+        branch = self.vars["branch"].get()
+        if self.branch_refs and branch in self.branch_refs.remote:
+            self.vars["branch"].set(branch.split("/", 1)[1])
 
     def toggle_token(self):
         self.token_visible = not self.token_visible
@@ -264,10 +1552,109 @@ class DiscordStyleGitLabUI:
     def select_files(self):
         files = filedialog.askopenfilenames()
         if files:
-            self.selected_files = list(files)
-            self.file_listbox.delete(0, tk.END)
-            for f in self.selected_files:
-                self.file_listbox.insert(tk.END, os.path.basename(f))
+            root = self.changes_root
+            known = set(self.changes.path(index) for index in range(len(self.changes)))
+            for f in files:
+                path = os.path.abspath(f)
+                if root and (path + os.sep).startswith(os.path.join(root, "")):
+                    path = os.path.relpath(path, root).replace(os.sep, "/")
+                if path not in known:
+                    self.changes.add(path, "", True)
+            self.apply_change_view()
+
+    def change_text(self, index):
+        mark = "[x]" if self.changes.checked[index] else "[ ]"
+        label = self.changes.path(index)
+        if index in self.changes.renames:
+            label = f"{self.changes.renames[index]} -> {label}"
+        return f"{mark} {self.changes.code(index):<2} {label}"
+
+    def toggle_change(self, event=None):
+        selected = self.file_list.selected()
+        for index in selected:
+            self.changes.toggle(index)
+        self.file_list.refresh(selected)
+        self.update_selected_files()
+        return "break"
+
+    def apply_change_view(self):
+        self.changes.apply(self.change_filter.get(), self.change_sort.get())
+        self.file_list.refresh()
+        self.update_selected_files()
+
+    def update_selected_files(self):
+        worktree = self.changes_root or ""
+        self.selected_files = [os.path.join(worktree, path) for path in self.changes.checked_paths()]
+        # A ticked rename also commits the removal of its old path
+        self.selected_files += [os.path.join(worktree, self.changes.renames[index])
+                                for index in self.changes.renames if self.changes.checked[index]]
+
+    def refresh_changes(self, paths=None):
+        # With paths (from the watcher) only those are scanned and merged into
+        # the current list, without them the whole tree is
+        directory = self.vars["local_dir"].get()
+        info = self.repo_locator.locate(directory) if directory else None
+        if info is None:
+            self.changes_info.config(text="Not a Git repository")
+            return
+        if self.status_scan is not None:
+            if not self.rescan_pending:
+                self.rescan_paths = set(paths) if paths else None
+            elif self.rescan_paths is not None:
+                self.rescan_paths = self.rescan_paths | set(paths) if paths else None
+            self.rescan_pending = True
+            return
+        self.rescan_pending = False
+        # Too many paths for one command line, or another repository: full scan
+        partial = bool(paths) and self.changes_root == info.worktree and len(paths) <= 500
+        paths = sorted(paths) if partial else None
+        self.status_scan = scanner = StatusScanner(info.worktree, paths=paths)
+        if self.watcher:
+            self.watcher.mute_index(3600)
+        previous = set(self.changes.checked_paths()) if self.changes_root == info.worktree else set()
+        self.changes = self.changes.without(paths) if partial else PathStore()
+        self.changes.filter_text = self.change_filter.get().lower()
+        self.changes_root = info.worktree
+        self.file_list.store = self.changes
+        self.file_list.refresh()
+        self.changes_info.config(text="Scanning...")
+        started = time.time()
+
+        def worker():
+            batch = []
+            try:
+                for entry in scanner.scan():
+                    if entry.kind == "ignored":
+                        continue
+                    batch.append(entry)
+                    if len(batch) >= 2000:
+                        self.call_in_ui(self.add_changes, batch, previous)
+                        batch = []
+            finally:
+                self.call_in_ui(self.add_changes, batch, previous)
+                self.call_in_ui(self.changes_scanned, scanner, time.time() - started)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def add_changes(self, entries, previous):
+        for entry in entries:
+            # Staged files and files that were ticked before stay ticked
+            self.changes.add(entry.path, entry.code, entry.staged or entry.path in previous, entry.orig_path)
+        self.file_list.refresh()
+
+    def changes_scanned(self, scanner, duration):
+        self.status_scan = None
+        if self.watcher:
+            self.watcher.mute_index(1.0)
+        if self.rescan_pending:
+            self.refresh_changes(self.rescan_paths)
+            return
+        if scanner.returncode != 0:
+            self.changes_info.config(text="git status failed")
+            return
+        self.apply_change_view()
+        self.changes_info.config(text=f"{len(self.changes)} changed files ({duration:.2f}s)")
+        self.set_ahead_behind(scanner.ahead_behind())
 
     def validate_inputs(self, required_fields):
         missing = [field for field in required_fields if not self.vars[field].get()]
@@ -277,58 +1664,159 @@ class DiscordStyleGitLabUI:
         return True
 
     def is_git_repo(self, path):
+        return self.repo_locator.locate(path) is not None
+
+    def call_in_ui(self, func, *args):
+        # Tk is not thread-safe, worker threads hand UI updates to the main loop
+        self.ui_queue.put((func, args))
+
+    def local_dir_changed(self):
+        self.refresh_branches()
+        # Typing a path fires on every key, only watch once it settled
+        if self.watch_pending:
+            self.root.after_cancel(self.watch_pending)
+        self.watch_pending = self.root.after(500, self.local_dir_settled)
+
+    def local_dir_settled(self):
+        self.watch_pending = None
+        self.watch_repository()
+
+    def process_ui_queue(self):
         try:
-            subprocess.run(['git', '-C', path, 'rev-parse', '--is-inside-work-tree'],
-                           check=True,
-                           capture_output=True,
-                           text=True)
-            return True
-        except subprocess.CalledProcessError:
-            return False
+            while True:
+                func, args = self.ui_queue.get_nowait()
+                func(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(50, self.process_ui_queue)
+
+    def open_workspace(self):
+        if self.workspace_window and self.workspace_window.window.winfo_exists():
+            self.workspace_window.window.lift()
+            return
+        self.workspace_window = WorkspaceWindow(self)
 
-    def toggle_buttons(self, state):
-        for btn in self.nav_buttons:
-            btn.state(['!disabled' if state else 'disabled'])
+    def open_dashboard(self):
+        if self.dashboard_window and self.dashboard_window.window.winfo_exists():
+            self.dashboard_window.window.lift()
+            self.dashboard_window.refresh()
+            return
+        self.dashboard_window = DashboardWindow(self)
 
-    def run_git_command(self, command, success_msg, error_msg):
-        def wrapper():
-            try:
-                self.toggle_buttons(False)
-                self.status.config(text="Processing...")
-                self.console.delete(1.0, tk.END)
-
-                process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace'
-                )
-
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        self.console.insert(tk.END, output)
-                        self.console.see(tk.END)
-
-                return_code = process.poll()
-                if return_code == 0:
-                    self.status.config(text=success_msg)
-                    messagebox.showinfo("Success", success_msg)
-                else:
-                    self.status.config(text="Error occurred")
-                    messagebox.showerror("Error", error_msg)
+    def open_push(self):
+        if self.push_window and self.push_window.window.winfo_exists():
+            self.push_window.window.lift()
+            self.push_window.refresh()
+            return
+        self.push_window = PushWindow(self)
 
-            except Exception as e:
-                self.status.config(text="Error occurred")
-                messagebox.showerror("Error", str(e))
-            finally:
-                self.toggle_buttons(True)
+    def open_worktrees(self):
+        if self.worktree_window and self.worktree_window.window.winfo_exists():
+            self.worktree_window.window.lift()
+            self.worktree_window.refresh()
+            return
+        self.worktree_window = WorktreeWindow(self)
+
+    def open_group_clone(self):
+        if self.group_window and self.group_window.window.winfo_exists():
+            self.group_window.window.lift()
+            return
+        self.group_window = GroupCloneWindow(self)
+
+    def open_metrics(self):
+        if self.metrics_window and self.metrics_window.window.winfo_exists():
+            self.metrics_window.window.lift()
+            self.metrics_window.refresh()
+            return
+        self.metrics_window = MetricsWindow(self)
+
+    def gitlab_client(self):
+        url = self.settings["gitlab_url"]
+        token = self.vars["token"].get()
+        if self.client is None or (self.client.base_url, self.client.token) != (url.rstrip("/"), token):
+            from gitengine.gitlab import GitLabClient  # http.client and ssl are only needed here
+            if self.client:
+                self.client.close()
+            self.client = GitLabClient(url, token)
+        return self.client
+
+    def auth_env(self):
+        return git_auth_env(self.settings["gitlab_url"],
+                            self.vars["username"].get(),
+                            self.vars["token"].get())
+
+    def update_bulk_job(self, job):
+        if job.state in ("done", "failed", "cancelled"):
+            self.trim_object_cache(job)
+        if self.workspace_window and self.workspace_window.window.winfo_exists():
+            self.workspace_window.update_job(job)
+        if self.group_window and self.group_window.window.winfo_exists():
+            self.group_window.update_job(job)
+        if self.worktree_window and self.worktree_window.window.winfo_exists():
+            self.worktree_window.update_job(job)
+        if self.push_window and self.push_window.window.winfo_exists():
+            self.push_window.update_job(job)
+
+    def trim_object_cache(self, job):
+        if not any(step.name == "cache" for step in job.pipeline.steps):
+            return
 
-        threading.Thread(target=wrapper, daemon=True).start()
+        def worker():
+            total, evicted = self.object_cache.evict()
+            text = f"Object cache: {format_bytes(total)} of {format_bytes(self.object_cache.max_bytes)} used"
+            if evicted:
+                text += ", evicted " + ", ".join(mirror.url for mirror in evicted)
+            self.call_in_ui(self.console_sink.write, text + "\n")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def job_output(self, job, text):
+        if len(self.scheduler.running()) > 1:
+            text = f"[#{job.id}] {text}"
+        self.console_sink.write(text)
+
+    def job_progress(self, job, event):
+        # Coalesce progress ticks, the UI only needs the newest state
+        if self.progress_job is None:
+            self.progress_job = job
+            self.call_in_ui(self.show_progress)
+        else:
+            self.progress_job = job
+
+    def show_progress(self):
+        job, self.progress_job = self.progress_job, None
+        if job and job.progress and job.state == "running":
+            self.progress.config(value=job.progress.percent)
+            self.status.config(text=job.progress.describe())
+
+    def job_finished(self, job):
+        self.progress.config(value=0)
+        if job.state == "done":
+            self.status.config(text=job.success_msg)
+            messagebox.showinfo("Success", job.success_msg)
+        elif job.state == "cancelled":
+            self.status.config(text=f"{job.name} cancelled")
+        else:
+            self.status.config(text="Error occurred")
+            messagebox.showerror("Error", job.error or job.error_msg)
+
+    def run_git_command(self, command, success_msg, error_msg, repo=None):
+        return self.run_pipeline(Pipeline.single(command), success_msg, error_msg, repo=repo)
+
+    def run_pipeline(self, pipeline, success_msg, error_msg, name=None, repo=None):
+        job = Job(name or " + ".join(step.name for step in pipeline.steps),
+                  pipeline, success_msg, error_msg,
+                  timeout=self.settings["job_timeout"] or None,
+                  repo=repo,
+                  env=self.auth_env())
+        return self.submit_job(job)
+
+    def submit_job(self, job):
+        if not self.scheduler.running():
+            self.console_sink.clear()
+        self.status.config(text="Processing...")
+        return self.scheduler.submit(job)
 
     def clone_repo(self):
         if not self.validate_inputs(["repo_url", "local_dir"]):
@@ -337,10 +1825,54 @@ class DiscordStyleGitLabUI:
         url = self.vars["repo_url"].get()
         directory = self.vars["local_dir"].get()
 
-        self.run_git_command(
-            ["git", "clone", url, directory],
-            "Repository cloned successfully",
-            "Failed to clone repository"
+        job = self.clone_job(url, directory)
+        if job:
+            self.submit_job(job)
+
+    def clone_strategy_changed(self):
+        # Shallow and partial clones bypass the object cache
+        cached = self.vars["clone_strategy"].get() in CACHED_STRATEGIES
+        self.cache_check.state(["!disabled"] if cached else ["disabled"])
+
+    def clone_job(self, url, directory, branch=None):
+        try:
+            pipeline = clone_pipeline(url, directory,
+                                      self.vars["clone_strategy"].get(),
+                                      self.vars["clone_depth"].get() or 1,
+                                      branch or self.vars["branch"].get(),
+                                      self.vars["sparse_paths"].get().split(),
+                                      cache=self.object_cache if self.settings["object_cache"] else None)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Invalid clone options: {e}")
+            return None
+        return Job("clone",
+                   pipeline,
+                   "Repository cloned successfully",
+                   "Failed to clone repository",
+                   timeout=self.settings["job_timeout"] or None,
+                   repo=directory,
+                   env=self.auth_env())
+
+    def upgrade_clone(self):
+        if not self.validate_inputs(["local_dir"]):
+            return
+
+        directory = self.vars["local_dir"].get()
+
+        if not self.is_git_repo(directory):
+            messagebox.showerror("Error", "Selected directory is not a Git repository")
+            return
+
+        pipeline = upgrade_pipeline(directory, self.repo_locator.locate(directory).common_dir)
+        if not pipeline.steps:
+            messagebox.showinfo("Upgrade Clone", "Repository is already a complete clone")
+            return
+        self.run_pipeline(
+            pipeline,
+            "Clone upgraded to full history",
+            "Failed to upgrade clone",
+            name="upgrade clone",
+            repo=directory
         )
 
     def commit(self):
@@ -355,17 +1887,40 @@ class DiscordStyleGitLabUI:
             messagebox.showerror("Error", "Selected directory is not a Git repository")
             return
 
-        commands = [
-            ["git", "-C", directory, "add", *self.selected_files],
-            ["git", "-C", directory, "commit", "-m", message]
-        ]
+        self.run_pipeline(
+            self.commit_pipeline(directory, message),
+            "Commit successful",
+            "Commit failed",
+            name="commit",
+            repo=directory
+        )
+
+    def commit_pipeline(self, directory, message):
+        worktree = self.repo_locator.locate(directory).worktree
+        return commit_pipeline(directory, worktree, message, self.selected_files)
+
+    def commit_and_push(self):
+        if not self.validate_inputs(["local_dir", "commit_message"]) or not self.selected_files:
+            messagebox.showerror("Error", "Select files to commit and enter commit message")
+            return
+
+        directory = self.vars["local_dir"].get()
+        message = self.vars["commit_message"].get()
 
-        for cmd in commands:
-            self.run_git_command(
-                cmd,
-                "Commit successful",
-                "Commit failed"
-            )
+        if not self.is_git_repo(directory):
+            messagebox.showerror("Error", "Selected directory is not a Git repository")
+            return
+
+        branch = self.vars["branch"].get() or "main"
+        pipeline = self.commit_pipeline(directory, message)
+        pipeline.add("push", push_command(directory, branch))
+        self.run_pipeline(
+            pipeline,
+            "Commit and push successful",
+            "Commit and push failed",
+            name="commit + push",
+            repo=directory
+        )
 
     def push(self):
         if not self.validate_inputs(["local_dir"]):
@@ -379,9 +1934,10 @@ class DiscordStyleGitLabUI:
 
         branch = self.vars["branch"].get() or "main"
         self.run_git_command(
-            ["git", "-C", directory, "push", "origin", branch],
+            push_command(directory, branch),
             "Push successful",
-            "Push failed"
+            "Push failed",
+            repo=directory
         )
 
     def pull(self):
@@ -389,39 +1945,72 @@ class DiscordStyleGitLabUI:
             return
 
         directory = self.vars["local_dir"].get()
-
-        if not self.is_git_repo(directory):
+        info = self.repo_locator.locate(directory)
+        if info is None:
             messagebox.showerror("Error", "Selected directory is not a Git repository")
             return
 
+        if self.pull_waiting:
+            return
+        if self.fetcher and self.fetcher.fetching(directory):
+            # A second fetch of the same repository would race the background
+            # one for the ref locks. Once it is done origin/<branch> is fresh
+            # and the pull can usually stay local.
+            self.console_sink.write(f"Waiting for the background fetch of {directory}\n")
+            self.pull_waiting = True
+            self.wait_for_fetch(directory)
+            return
+
         branch = self.vars["branch"].get() or "main"
-        self.run_git_command(
-            ["git", "-C", directory, "pull", "origin", branch],
+        strategy = self.vars["pull_strategy"].get()
+        # Right after a background fetch origin/<branch> is current, the pull then stays local.
+        # Without Auto fetch there is no such fetch and every pull contacts the remote.
+        last_fetch = self.fetcher.last_fetch(directory) if self.fetcher else None
+        local = strategy != "fetch-only" and can_pull_locally(info, branch, last_fetch,
+                                                              self.settings["pull_max_fetch_age"])
+        self.run_pipeline(
+            pull_pipeline(directory, branch, strategy, not local, RefReader(info).head()[1]),
             "Pull successful",
-            "Pull failed"
+            "Pull failed",
+            name=f"pull {strategy}" + (" (local)" if local else ""),
+            repo=directory
         )
 
+    def wait_for_fetch(self, directory):
+        if self.fetcher and self.fetcher.fetching(directory):
+            self.root.after(200, self.wait_for_fetch, directory)
+            return
+        self.pull_waiting = False
+        self.pull()
+
     def load_config(self):
-        try:
-            with open('config.json', 'r') as f:
-                config = json.load(f)
-                for key in self.vars:
-                    if key in config:
-                        self.vars[key].set(config[key])
-        except FileNotFoundError:
-            pass
+        config = load_config()
+        for key in self.vars:
+            self.vars[key].set(config[key])
+        self.settings = {key: value for key, value in config.items() if key not in self.vars}
 
     def save_config(self):
         config = {key: var.get() for key, var in self.vars.items()}
-        with open('config.json', 'w') as f:
-            json.dump(config, f)
+        config.update(self.settings)
+        save_config(config)
 
     def on_close(self):
         self.save_config()
+        self.scheduler.shutdown()
+        self.bulk_scheduler.shutdown()
+        if self.fetcher:
+            self.fetcher.stop()
+        if self.watcher:
+            self.watcher.stop()
+        if self.client:
+            self.client.close()
         self.root.destroy()
 
 
 if __name__ == "__main__":
+    profile = StartupProfile("--profile-startup" in sys.argv)
+    profile.mark("imports")
     root = tk.Tk()
-    app = DiscordStyleGitLabUI(root)
+    profile.mark("tk")
+    app = DiscordStyleGitLabUI(root, profile)
     root.mainloop()
\ No newline at end of file